@@ -0,0 +1,62 @@
+"""
+Micro-benchmark di `fix_accent` rispetto alla versione precedente,
+basata su 13 `str.replace` in cascata.
+
+    python benchmarks/bench_fix_accent.py [docs/_rst/cad.xml]
+
+Misura sia la chiamata riga per riga sia quella sull'intero articolo
+(come in `parse_articolo`), come minimo su `repeat` ripetizioni alternate
+tra le due versioni, e verifica che i risultati coincidano.
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from parsel import Selector  # noqa: E402
+
+from cad_normattiva import BASEDIR, fix_accent  # noqa: E402
+
+
+def fix_accent_legacy(l):
+    l = l.replace("a'", "à").replace("e'", "é").replace("i'", "ì").replace("A'", "À")
+    l = l.replace("o'", "ò").replace("u'", "ù").replace("E'", "È")
+    l = (
+        l.replace("pò", "po'")
+        .replace("Pò", "Po'")
+        .replace(" é ", " è ")
+        .replace("e\\'", "è")
+        .replace("cioé", "cioè")
+    )
+    if l[-2:] == " é":
+        l = l[:-1] + "è"
+    if l[0:2] == "é ":
+        l = "è" + l[1:]
+
+    return l
+
+
+def main(fpath, number=5, repeat=20):
+    cad = Selector(text=Path(fpath).read_text(), type="html")
+    articoli = [a.xpath(".//corpo/p/text()").extract() for a in cad.xpath("//articolo")]
+    lines = [l for a in articoli for l in a]
+    texts = ["\n".join(a) for a in articoli]
+    print(f"{fpath}: {len(articoli)} articoli, {len(lines)} righe")
+
+    functions = (fix_accent_legacy, fix_accent)
+    for f in functions:
+        assert [f(l) for l in lines] == [fix_accent_legacy(l) for l in lines]
+        assert [f(t) for t in texts] == [fix_accent_legacy(t) for t in texts]
+    best = {f: [float("inf")] * 2 for f in functions}
+    for _ in range(repeat):
+        for f in functions:
+            for i, data in enumerate((lines, texts)):
+                t = timeit.timeit(lambda: [f(x) for x in data], number=number)
+                best[f][i] = min(best[f][i], t / number * 1000)
+    for f, (t_lines, t_texts) in best.items():
+        print(f"{f.__name__:20} righe: {t_lines:8.2f} ms  articoli: {t_texts:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else f"{BASEDIR}/cad.xml")
@@ -0,0 +1,59 @@
+"""
+Stress test della gestione delle liste numerate in `format_articolo`
+con articoli sintetici di molte migliaia di punti, alternati a righe di
+testo così che ogni punto chiuda una lista.
+
+    python benchmarks/bench_list_stress.py [10000 20000 100000]
+
+Il costo per punto deve restare costante al crescere dell'articolo.
+La versione precedente (inserimento nella lista) e' misurata fino a
+LEGACY_MAX punti, oltre diventa troppo lenta.
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bench_parse_articolo import (  # noqa: E402
+    format_articolo_legacy,
+    format_articolo_rst,
+)
+
+LEGACY_MAX = 20000
+
+
+def synthetic_articolo(punti):
+    lines = [
+        "Art. 1",
+        "(Definizioni)",
+        "1. Ai fini del presente codice si intende per:",
+    ]
+    for i in range(punti):
+        lines.append(f"{i}) definizione numero {i} con la liberta' di scelta;")
+        lines.append(f"testo che chiude la lista {i}")
+    return lines
+
+
+def timed(f, lines):
+    t0 = time.perf_counter()
+    f(lines)
+    return time.perf_counter() - t0
+
+
+def main(sizes):
+    for punti in sizes:
+        lines = synthetic_articolo(punti)
+        t = timed(format_articolo_rst, lines)
+        report = f"{punti:8} punti: {t * 1000:9.1f} ms {t / punti * 1e6:6.2f} us/punto"
+        if punti <= LEGACY_MAX:
+            assert format_articolo_rst(lines) == format_articolo_legacy(lines)
+            t = timed(format_articolo_legacy, lines)
+            report += (
+                f"  precedente: {t * 1000:9.1f} ms {t / punti * 1e6:6.2f} us/punto"
+            )
+        print(report)
+
+
+if __name__ == "__main__":
+    main([int(x) for x in sys.argv[1:]] or [1000, 10000, 20000, 100000])
@@ -0,0 +1,76 @@
+"""
+Benchmark del costo per articolo di `format_articolo` rispetto alla
+versione precedente, che compilava le regex a ogni chiamata e faceva
+piu' passate sulle righe.
+
+    python benchmarks/bench_parse_articolo.py [docs/_rst/cad.xml]
+"""
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bench_fix_accent import fix_accent_legacy  # noqa: E402
+from parsel import Selector  # noqa: E402
+
+from cad_normattiva import BASEDIR, articolo_lines, format_articolo  # noqa: E402
+
+
+def format_articolo_legacy(lines):
+    re_dashes = re.compile("^---+\\s*$")
+    re_comma = re.compile(r"^([0-9a-z\-]+)\)\s*")
+    re_punto = re.compile(r"^([0-9a-z\-]+)\.\s*")
+
+    lines = [re_dashes.sub("\n", l) for l in lines]
+    lines = [re.sub(r"^\(\(|\)\)$", "", l.strip(" ")) for l in lines]
+
+    j = 1
+    while j < len(lines):
+        l0, l1 = lines[j - 1 : j + 1]
+        l0_numbered = re_comma.match(l0) or re_punto.match(l0)
+        l1_numbered = re_comma.match(l1) or re_punto.match(l1)
+        if l0_numbered and not l1_numbered:
+            lines.insert(j, "\n")
+            j += 1
+        j += 1
+
+    lines = [re_comma.sub(r"\n  \1\) ", l) for l in lines]
+    lines = [re_punto.sub(r"\n  \1\. ", l) for l in lines]
+
+    for i, l in enumerate(lines):
+        if l.startswith("Art"):
+            break
+    intro = lines[:i]
+    art, headline, *body = lines[i:]
+    title = art + ". " + headline.strip("().")
+    txt_lines = [title, "^" * len(title), ""] + body + ["\n"]
+    txt_intro = fix_accent_legacy("\n".join(intro + ["\n"])) if i else None
+    txt_lines = fix_accent_legacy("\n".join(txt_lines))
+
+    if not txt_intro:
+        txt_lines = txt_lines.splitlines()
+        title, body = "\n".join(txt_lines[:2]), "\n".join(txt_lines[2:])
+        txt_lines = title + "\n" + body
+    return txt_intro, txt_lines
+
+
+def format_articolo_rst(lines):
+    """`format_articolo` senza gli offset, come `format_articolo_legacy`."""
+    return format_articolo(lines)[:2]
+
+
+def main(fpath, number=5):
+    cad = Selector(text=Path(fpath).read_text(), type="html")
+    articoli = [articolo_lines(a) for a in cad.xpath("//articolo")]
+    print(f"{fpath}: {len(articoli)} articoli")
+
+    for f in (format_articolo_legacy, format_articolo_rst):
+        assert [f(a) for a in articoli] == [format_articolo_legacy(a) for a in articoli]
+        t = timeit.timeit(lambda: [f(a) for a in articoli], number=number)
+        print(f"{f.__name__:24} {t / number / len(articoli) * 1e6:8.1f} us/articolo")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else f"{BASEDIR}/cad.xml")
@@ -0,0 +1,70 @@
+"""
+Tempo di avvio a freddo della CLI, che in batch viene eseguita una volta
+per atto: la mediana di `python -m cad_normattiva --help` meno quella
+dell'interprete vuoto deve restare sotto BUDGET secondi.
+
+    python benchmarks/bench_startup.py [--runs 20] [--budget 0.1]
+
+Esce con codice 1 se il budget e' superato o se l'avvio importa uno dei
+moduli in HEAVY, che vanno caricati solo quando servono.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+BUDGET = 0.1
+HEAVY = ("scrapy", "pytest", "parsel", "lxml", "multiprocessing", "yaml")
+
+
+def timed(args, runs):
+    ret = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args], check=True, cwd=ROOT, stdout=subprocess.DEVNULL
+        )
+        ret.append(time.perf_counter() - t0)
+    return statistics.median(ret)
+
+
+def heavy_imports():
+    code = (
+        "import sys, cad_normattiva.cli; "
+        "print(' '.join(sorted({m.split('.')[0] for m in sys.modules})))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return sorted(set(out.split()) & set(HEAVY))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=BUDGET)
+    args = parser.parse_args()
+
+    bare = timed(["-c", "pass"], args.runs)
+    cli = timed(["-m", "cad_normattiva", "--help"], args.runs)
+    heavy = heavy_imports()
+    print(f"python -c pass:               {bare * 1000:7.1f} ms")
+    print(f"python -m cad_normattiva:     {cli * 1000:7.1f} ms")
+    print(
+        f"avvio (budget {args.budget * 1000:.0f} ms):       {(cli - bare) * 1000:7.1f} ms"
+    )
+    if heavy:
+        print("moduli importati all'avvio:", *heavy)
+    if heavy or cli - bare > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Benchmark del formatter su documenti sintetici (vedi synthetic.py) a 1x,
+10x e 100x le dimensioni del CAD: per ogni funzione misura gli articoli
+al secondo e il picco di memoria.
+
+    python benchmarks/bench_suite.py [--scales 1 10 100] [--only parse_capo]
+    python benchmarks/bench_suite.py --save benchmarks/baseline.json
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json
+
+Ogni misura gira in un processo separato, che legge il documento
+generato una sola volta per scala: il picco di memoria e' la crescita di
+ru_maxrss durante la misura, quindi non dipende dalle misure precedenti
+ne' dalla generazione del documento. "CAD.parse(stream)" legge il file
+in streaming, senza caricarlo in memoria. Con --baseline il
+risultato e' confrontato con un'esecuzione salvata: se il throughput cala
+o la memoria cresce oltre --tolerance lo script esce con codice 1.
+"""
+import argparse
+import json
+import logging
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cad_normattiva.synthetic import synthetic_scale  # noqa: E402
+
+SCALES = (1, 10, 100)
+
+
+def selector(text):
+    from parsel import Selector
+
+    return Selector(text=text, type="html")
+
+
+def bench_parse_capo(fpath):
+    from cad_normattiva import parse_capo
+
+    capi = selector(fpath.read_text()).xpath("//capo")
+    t0 = time.perf_counter()
+    for c in capi:
+        parse_capo(c)
+    return time.perf_counter() - t0, len(capi)
+
+
+def bench_parse_articolo(fpath):
+    from cad_normattiva import parse_articolo
+
+    articoli = selector(fpath.read_text()).xpath("//articolo")
+    t0 = time.perf_counter()
+    for a in articoli:
+        parse_articolo(a)
+    return time.perf_counter() - t0, len(articoli)
+
+
+def bench_fix_accent(fpath):
+    from cad_normattiva import articolo_lines, fix_accent
+
+    articoli = [
+        articolo_lines(a) for a in selector(fpath.read_text()).xpath("//articolo")
+    ]
+    t0 = time.perf_counter()
+    for lines in articoli:
+        for l in lines:
+            fix_accent(l)
+    return time.perf_counter() - t0, len(articoli)
+
+
+def bench_cad_parse(fpath):
+    from cad_normattiva import CAD
+
+    t0 = time.perf_counter()
+    cadparser = CAD(text=fpath.read_text())
+    cadparser.parse()
+    return time.perf_counter() - t0, count_articoli(cadparser)
+
+
+def bench_cad_parse_stream(fpath):
+    from cad_normattiva import CAD
+
+    t0 = time.perf_counter()
+    cadparser = CAD(source=fpath)
+    cadparser.parse()
+    return time.perf_counter() - t0, count_articoli(cadparser)
+
+
+def bench_dump_index(fpath):
+    from cad_normattiva import CAD
+
+    cadparser = CAD(text=fpath.read_text())
+    cadparser.parse()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        outdir = Path(tmpdir) / "_rst"
+        outdir.mkdir()
+        t0 = time.perf_counter()
+        cadparser.dump_index(outdir)
+        return time.perf_counter() - t0, count_articoli(cadparser)
+
+
+def count_articoli(cadparser):
+    return sum(1 for _ in cadparser.iter_articoli())
+
+
+BENCHMARKS = {
+    "parse_capo": bench_parse_capo,
+    "parse_articolo": bench_parse_articolo,
+    "fix_accent": bench_fix_accent,
+    "CAD.parse": bench_cad_parse,
+    "CAD.parse(stream)": bench_cad_parse_stream,
+    "CAD.dump_index": bench_dump_index,
+}
+
+
+def peak_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_one(name, fpath):
+    """Esegue una misura nel processo corrente e la stampa come JSON."""
+    logging.disable(logging.INFO)
+    # Import the formatter first: the interpreter is not part of the measure.
+    import parsel  # noqa: F401
+
+    import cad_normattiva.formatter  # noqa: F401
+
+    before = peak_kb()
+    seconds, items = BENCHMARKS[name](Path(fpath))
+    print(
+        json.dumps(
+            {
+                "seconds": round(seconds, 4),
+                "items": items,
+                "items_per_s": round(items / seconds, 1),
+                "peak_kb": peak_kb() - before,
+            }
+        )
+    )
+
+
+def run(names, scales):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for scale in scales:
+            fpath = Path(tmpdir) / f"cad-{scale}x.xml"
+            fpath.write_text(synthetic_scale(scale))
+            for name in names:
+                out = subprocess.run(
+                    [sys.executable, __file__, "--one", name, str(fpath)],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                key = f"{name}@{scale}x"
+                results[key] = json.loads(out.splitlines()[-1])
+                r = results[key]
+                print(
+                    f"{key:24} {r['items']:7} elementi {r['seconds']:8.3f} s "
+                    f"{r['items_per_s']:10.1f} /s {r['peak_kb'] / 1024:8.1f} MB"
+                )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Restituisce le regressioni rispetto a `baseline`."""
+    regressions = []
+    for key, r in results.items():
+        if key not in baseline:
+            continue
+        b = baseline[key]
+        if r["items_per_s"] < b["items_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: {r['items_per_s']}/s, baseline {b['items_per_s']}"
+            )
+        if r["peak_kb"] > b["peak_kb"] * (1 + tolerance):
+            regressions.append(f"{key}: {r['peak_kb']} kB, baseline {b['peak_kb']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--save", metavar="FILE", help="salva i risultati")
+    parser.add_argument("--baseline", metavar="FILE", help="confronta i risultati")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--one", nargs=2, metavar=("NAME", "FILE"), help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.one:
+        return run_one(*args.one)
+
+    results = run(list(args.only), args.scales)
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=1, sort_keys=True))
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.tolerance)
+        for r in regressions:
+            print("REGRESSION", r)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
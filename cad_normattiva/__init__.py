@@ -0,0 +1,15 @@
+"""
+Formatter dei testi di normattiva in file .rst per sphinx.
+
+I nomi di `cad_normattiva.formatter` sono accessibili anche dal package,
+e vengono importati solo al primo accesso.
+"""
+import importlib
+
+
+def __getattr__(name):
+    formatter = importlib.import_module(".formatter", __name__)
+    try:
+        return getattr(formatter, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -0,0 +1,192 @@
+"""
+Atti da scaricare da normattiva e loro salvataggio su disco, in comune
+tra lo spider scrapy (scrapy/normattiva.py) e `cad_normattiva.fetch`.
+"""
+import hashlib
+import logging
+import re
+from pathlib import Path
+
+import yaml
+
+from .store import open_snapshot
+
+log = logging.getLogger()
+
+BASEURL = "https://www.normattiva.it/uri-res/N2Ls?"
+STATE = "docs/_cache/fetch_state.yml"
+DEFAULT_URN = (
+    # "urn:nir:stato:decreto.legislativo:2020;76!vig=2050"
+    "urn:nir:stato:decreto.legislativo:2005-03-07;82!vig=2021"
+)
+
+
+def urn_name(urn):
+    """
+    Ricava un nome per la directory dell'atto dalla URN, es.
+    urn:nir:stato:decreto.legislativo:2005-03-07;82!vig=2021
+        -> decreto.legislativo-2005-03-07-82
+    """
+    urn = urn.split("!", 1)[0]
+    return re.sub("[^0-9a-zA-Z.]+", "-", urn.split(":", 3)[-1]).strip("-")
+
+
+def read_urns(fpath):
+    """
+    Legge un file con una URN per riga, seguita opzionalmente dal nome
+    della directory dell'atto. Le righe vuote o che iniziano con # sono
+    ignorate. Es:
+
+        urn:nir:stato:decreto.legislativo:2005-03-07;82!vig=2021 cad
+        urn:nir:stato:decreto.legislativo:2020;76
+    """
+    for line in Path(fpath).read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        urn, *name = line.split()
+        yield urn, name[0] if name else urn_name(urn)
+
+
+def make_acts(urns=None, outdir="docs/_acts"):
+    """
+    Gli atti elencati nel file `urns`, ognuno in outdir/{nome}/;
+    senza file, il CAD in docs/_rst.
+    """
+    if urns:
+        return [
+            {"urn": urn, "name": name, "dpath": Path(outdir) / name}
+            for urn, name in read_urns(urns)
+        ]
+    return [
+        {
+            "urn": DEFAULT_URN,
+            "name": "cad",
+            "dpath": Path("docs/_rst"),
+            "document_settings": Path("docs/document_settings.yml"),
+        }
+    ]
+
+
+def parse_atto(selector, text):
+    """
+    I metadati dell'atto dalla pagina di una URN.
+
+    :param selector: la pagina, come `parsel.Selector`.
+    :param text: il sorgente della pagina.
+    """
+    return {
+        "codiceRedazionale": selector.xpath(
+            '//input[@name="atto.codiceRedazionale"]'
+        ).attrib["value"],
+        "dataPubblicazioneGazzetta": selector.xpath(
+            '//input[@name="atto.dataPubblicazioneGazzetta"]'
+        ).attrib["value"],
+        "dataVigenza": re.findall(r"atto.dataVigenza=(\d+-\d+-\d+)", text)[0],
+        "titolo": selector.xpath('//meta[@property="eli:title"]/@content')
+        .get()
+        .strip(),
+    }
+
+
+def export_url(act):
+    """La pagina con il form di export, relativa all'host di normattiva."""
+    return (
+        f"/atto/vediMenuExport?"
+        f"atto.dataPubblicazioneGazzetta={act['dataPubblicazioneGazzetta']}&"
+        f"atto.codiceRedazionale={act['codiceRedazionale']}&currentSearch="
+    )
+
+
+class FetchState(object):
+    """
+    Stato degli ultimi download, per URN: codiceRedazionale, dataVigenza,
+    sha1 e percorso dell'export salvato.
+    """
+
+    def __init__(self, fpath=STATE):
+        self.fpath = Path(fpath)
+        self.state = {}
+        if self.fpath.exists():
+            self.state = yaml.safe_load(self.fpath.read_text()) or {}
+
+    def get(self, urn):
+        return self.state.get(urn)
+
+    def is_unchanged(self, urn, act):
+        """True se l'export per questa dataVigenza e' gia' su disco."""
+        saved = self.get(urn)
+        if not saved or any(
+            saved.get(k) != act.get(k) for k in ("codiceRedazionale", "dataVigenza")
+        ):
+            return False
+        fpath = Path(saved["path"])
+        if not fpath.exists():
+            return False
+        with open_snapshot(fpath) as f:
+            return hashlib.sha1(f.read()).hexdigest() == saved["sha1"]
+
+    def update(self, urn, act, fpath, body):
+        self.state[urn] = {
+            k: act[k]
+            for k in (
+                "codiceRedazionale",
+                "dataPubblicazioneGazzetta",
+                "dataVigenza",
+                "titolo",
+            )
+        }
+        self.state[urn].update(
+            {"path": str(fpath), "sha1": hashlib.sha1(body).hexdigest()}
+        )
+        self.fpath.parent.mkdir(parents=True, exist_ok=True)
+        self.fpath.write_text(yaml.safe_dump(self.state))
+
+
+def save_act(act, body, state, store=None):
+    """
+    Salva l'export in {nome}.xml e {nome}-{dataVigenza}.xml, aggiorna lo
+    stato dei download e il nome e la versione in document_settings.yml.
+
+    :param store: uno `SnapshotStore`: l'export viene salvato una volta,
+        compresso, e i due file diventano link all'oggetto.
+    """
+    dpath, name = act["dpath"], act["name"]
+    dpath.mkdir(parents=True, exist_ok=True)
+    snapshot = dpath / f"{name}-{act['dataVigenza']}.xml"
+    if store:
+        _, fpath = store.put(body)
+        store.link(snapshot, fpath)
+        store.link(dpath / f"{name}.xml", fpath)
+    else:
+        for fpath in (dpath / f"{name}.xml", snapshot):
+            # Never write through a link into the store.
+            fpath.unlink(missing_ok=True)
+            fpath.write_bytes(body)
+    state.update(act["urn"], act, snapshot, body)
+    document_settings_yaml = act.get(
+        "document_settings", dpath / "document_settings.yml"
+    )
+    if document_settings_yaml.exists():
+        document_settings = yaml.safe_load(document_settings_yaml.read_text())
+    else:
+        document_settings = {"document": {}}
+    document_settings["document"].update(
+        {
+            "name": act["titolo"],
+            "version": f"v{act['dataVigenza']}",
+        }
+    )
+    document_settings_yaml.write_text(yaml.safe_dump(document_settings))
+
+
+def replay_act(act, state, store=None):
+    """Ripristina l'ultimo export salvato, senza accedere alla rete."""
+    saved = state.get(act["urn"])
+    if not saved:
+        log.warning("Nessun export salvato per %s", act["urn"])
+        return False
+    act.update(saved)
+    with open_snapshot(saved["path"]) as f:
+        save_act(act, f.read(), state, store=store)
+    return True
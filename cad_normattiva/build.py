@@ -0,0 +1,177 @@
+"""
+Build incrementale del sito: formatta l'atto, controlla con doc8 solo i
+file .rst cambiati e ricostruisce con sphinx solo le pagine cambiate.
+
+    python -m cad_normattiva.build [docs/_rst/cad.xml] [--cache]
+
+- il formatter riscrive solo i file cambiati (vedi `OutputWriter`) e ne
+  restituisce la lista;
+- doc8 controlla solo quei file;
+- sphinx-build usa `-j auto` e un ambiente persistente (doctree ed
+  environment.pickle in _build/.doctrees) e riceve la lista dei file
+  cambiati, quindi riscrive solo le loro pagine. Senza ambiente, o con
+  `--full`, la build e' completa.
+
+Se nessun file e' cambiato, doc8 e sphinx non vengono eseguiti.
+"""
+import argparse
+import logging
+import os
+import subprocess
+from pathlib import Path
+
+from .formatter import BASEDIR, CACHEDIR, CAD, PROFILER, ParseCache
+from .store import read_snapshot
+
+log = logging.getLogger()
+
+DOCDIR = "docs"
+BUILDDIR = "_build"
+DOC8_IGNORE = "D001,D002,D003,D004"
+
+
+def rst_files(fpaths):
+    """I file .rst tra quelli scritti dal formatter, normalizzati."""
+    return sorted({os.path.normpath(f) for f in fpaths if str(f).endswith(".rst")})
+
+
+def doc8_command(files):
+    return ["doc8", "--ignore", DOC8_IGNORE, *files]
+
+
+def sphinx_command(
+    files=None, srcdir=DOCDIR, builddir=BUILDDIR, builder="html", jobs="auto"
+):
+    """
+    Il comando sphinx-build. Con `files` e un ambiente gia' salvato vengono
+    scritte solo le pagine di `files`; gli altri documenti sono comunque
+    letti dall'ambiente, quindi i file rimossi vengono rilevati.
+    """
+    doctrees = os.path.join(builddir, ".doctrees")
+    command = ["sphinx-build", "-b", builder, "-j", str(jobs), "-d", doctrees]
+    command += [srcdir, builddir]
+    if files and Path(doctrees, "environment.pickle").exists():
+        command += files
+    return command
+
+
+def build(
+    xml,
+    outdir=BASEDIR,
+    srcdir=DOCDIR,
+    builddir=BUILDDIR,
+    jobs="auto",
+    cache=None,
+    stream=False,
+    links=False,
+    full=False,
+    run=subprocess.run,
+    schema="cad",
+):
+    """
+    Formatta `xml` in `outdir` ed esegue doc8 e sphinx-build sui file
+    cambiati.
+
+    :param run: la funzione che esegue i comandi, come `subprocess.run`.
+    :param schema: le partizioni dell'atto, vedi `CAD`.
+    :return: i file .rst cambiati.
+    """
+    with PROFILER.stage("parse"):
+        if stream:
+            cadparser = CAD(source=xml, schema=schema)
+        else:
+            cadparser = CAD(text=read_snapshot(xml), schema=schema)
+        cadparser.parse(cache=cache)
+    with PROFILER.stage("dump"):
+        changed = cadparser.dump_index(outdir, incremental=True, links=links)
+    return publish(
+        changed, srcdir=srcdir, builddir=builddir, jobs=jobs, full=full, run=run
+    )
+
+
+def publish(
+    changed,
+    srcdir=DOCDIR,
+    builddir=BUILDDIR,
+    jobs="auto",
+    full=False,
+    run=subprocess.run,
+):
+    """
+    Esegue doc8 e sphinx-build sui file .rst tra quelli scritti dal
+    formatter (`changed`), vedi `build`.
+
+    :return: i file .rst cambiati.
+    """
+    files = rst_files(changed)
+    log.info("File .rst cambiati: %d", len(files))
+    if not files and not full:
+        log.info("Nessun file cambiato, salto doc8 e sphinx")
+        return files
+
+    if files:
+        with PROFILER.stage("doc8"):
+            run(doc8_command(files), check=True)
+    with PROFILER.stage("sphinx"):
+        run(
+            sphinx_command(
+                None if full else files, srcdir=srcdir, builddir=builddir, jobs=jobs
+            ),
+            check=True,
+        )
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("xml", nargs="?", default=f"{BASEDIR}/cad.xml")
+    parser.add_argument("--outdir", default=BASEDIR)
+    parser.add_argument("--srcdir", default=DOCDIR, help="La directory di sphinx.")
+    parser.add_argument("--builddir", default=BUILDDIR)
+    parser.add_argument("--jobs", default="auto", help="Processi di sphinx-build.")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--links", action="store_true")
+    parser.add_argument("--schema", default="cad", help="Vedi cad-normattiva.")
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=CACHEDIR,
+        default=None,
+        help=f"Usa la cache degli articoli formattati (default: {CACHEDIR}).",
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="Ricostruisce tutte le pagine."
+    )
+    parser.add_argument(
+        "--profile", metavar="FILE", help="Aggiunge i tempi di ogni fase a FILE."
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.profile:
+        PROFILER.start()
+
+    cache = ParseCache(args.cache) if args.cache else None
+    try:
+        build(
+            args.xml,
+            outdir=args.outdir,
+            srcdir=args.srcdir,
+            builddir=args.builddir,
+            jobs=args.jobs,
+            cache=cache,
+            stream=args.stream,
+            links=args.links,
+            full=args.full,
+            schema=args.schema,
+        )
+    except subprocess.CalledProcessError as e:
+        parser.exit(e.returncode, f"{' '.join(e.cmd[:2])} fallito\n")
+    finally:
+        if cache:
+            cache.close()
+        if args.profile:
+            PROFILER.dump(args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Interfaccia a riga di comando, installata come `cad-normattiva`.
+
+    python -m cad_normattiva docs/_rst/cad.xml --outdir docs/_rst
+"""
+import argparse
+import json
+import logging
+from pathlib import Path
+
+from .formatter import (
+    BASEDIR,
+    CACHEDIR,
+    CAD,
+    PROFILER,
+    SEARCHDB,
+    ParseCache,
+    find_snapshots,
+    parse_batch,
+    snapshot_version,
+)
+from .rules import ACCENT_PLAN, read_accent_rules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Formatta una norma di normattiva.")
+    parser.add_argument("xml", nargs="?", default=f"{BASEDIR}/cad.xml")
+    parser.add_argument("--outdir", default=BASEDIR)
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Legge il documento in streaming, con memoria costante.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Numero di processi usati per formattare gli articoli.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Riscrive solo i file .rst cambiati e rimuove quelli orfani.",
+    )
+    parser.add_argument(
+        "--atomic",
+        action="store_true",
+        help="Scrive i file in una directory di staging e la sostituisce "
+        "a OUTDIR in modo atomico.",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=CACHEDIR,
+        default=None,
+        help=f"Usa la cache degli articoli formattati (default: {CACHEDIR}).",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=100000,
+        help="Numero massimo di articoli nella cache.",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="DIR_OR_GLOB",
+        help="Formatta tutte le versioni cad-{dataVigenza}.xml, "
+        "ognuna in OUTDIR/{dataVigenza}/_rst.",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Scrive in FILE un report JSON con tempi e contatori della pipeline.",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="Con --profile, salva in FILE le statistiche di cProfile.",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="Con --profile, registra il picco di memoria e le allocazioni.",
+    )
+    parser.add_argument(
+        "--articolo",
+        metavar="ID",
+        help="Stampa solo l'articolo ID (es. 64-bis), usando l'indice degli "
+        "articoli del documento.",
+    )
+    parser.add_argument(
+        "--vigenza",
+        metavar="YYYY-MM-DD",
+        help="Con --batch e --articolo, usa la versione in vigore a questa data.",
+    )
+    parser.add_argument(
+        "--diff",
+        nargs="*",
+        metavar="OLD NEW",
+        help="Scrive in OUTDIR le modifiche tra due versioni, in JSON e RST. "
+        "Con --batch confronta ogni versione con la precedente.",
+    )
+    parser.add_argument(
+        "--format",
+        action="append",
+        metavar="FMT[=FILE]",
+        help="Formato di output: rst (default), md, jsonl o html; ripetibile, "
+        "con una sola analisi del documento. FILE e' '-' per stdout, "
+        "di default OUTDIR/../{nome}.{FMT}; con --batch i formati sono "
+        "scritti in OUTDIR/{dataVigenza}.",
+    )
+    parser.add_argument(
+        "--index",
+        nargs="?",
+        const=SEARCHDB,
+        default=None,
+        metavar="FILE",
+        help=f"Aggiorna l'indice di ricerca con gli articoli (default: {SEARCHDB}).",
+    )
+    parser.add_argument(
+        "--search",
+        metavar="QUERY",
+        help="Cerca QUERY negli articoli di tutti gli atti indicizzati.",
+    )
+    parser.add_argument("--atto", help="Con --search, cerca solo in questo atto.")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument(
+        "--links",
+        action="store_true",
+        help="Trasforma i riferimenti tra articoli in link e salva il grafo dei "
+        "riferimenti in OUTDIR/riferimenti.json.",
+    )
+    parser.add_argument(
+        "--schema",
+        default="cad",
+        help="Le partizioni dell'atto, dalla piu' esterna: cad (capo, sezione), "
+        "codice (libro, parte, titolo, capo, sezione) o i livelli separati "
+        "da virgole, es. titolo,capo.",
+    )
+    parser.add_argument(
+        "--accent-rules",
+        metavar="FILE",
+        help="Aggiunge alle regole degli accenti quelle del file JSON, "
+        'es. [["U\'", "Ù"]].',
+    )
+    parser.add_argument(
+        "--cited-by",
+        metavar="ID",
+        help="Elenca gli articoli che citano l'articolo ID, dal grafo in OUTDIR.",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG)
+    if args.search:
+        from .search import SearchIndex
+
+        index = SearchIndex(args.index or SEARCHDB)
+        for r in index.search(args.search, atto=args.atto, limit=args.limit):
+            atto = " ".join(x for x in (r.atto, r.versione) if x)
+            comma = f", comma {r.comma}" if r.comma else ""
+            print(f"{atto} art. {r.articolo}{comma}: {r.snippet}")
+        index.close()
+        return
+    if args.cited_by:
+        from .references import cited_by
+
+        for c in cited_by(args.outdir, args.cited_by):
+            comma = f", comma {c['comma']}" if c["comma"] else ""
+            citato = f" (comma {c['comma_citato']})" if c["comma_citato"] else ""
+            print(f"art. {c['articolo']}{comma}{citato}")
+        return
+    plan = read_accent_rules(args.accent_rules) if args.accent_rules else ACCENT_PLAN
+    if args.articolo:
+        from .emitters import rst_articolo
+        from .lookup import ArticoloIndex, find_vigenza
+
+        source = find_vigenza(args.batch, args.vigenza) if args.batch else args.xml
+        index = ArticoloIndex(source, schema=args.schema)
+        try:
+            articolo, _ = index.render(args.articolo, plan)
+        except KeyError:
+            parser.exit(1, f"Articolo {args.articolo} non trovato in {source}\n")
+        finally:
+            index.close()
+        print(rst_articolo(articolo))
+        return
+    if args.profile:
+        PROFILER.start(cprofile=bool(args.cprofile), tracemalloc=args.tracemalloc)
+
+    cache = ParseCache(args.cache, max_entries=args.cache_size) if args.cache else None
+    index = None
+    if args.index:
+        from .search import SearchIndex
+
+        index = SearchIndex(args.index)
+    if args.diff is not None:
+        from .diff import diff_articoli, diff_history, parse_snapshot, write_changes
+
+        if args.batch:
+            report = diff_history(
+                find_snapshots(args.batch),
+                args.outdir,
+                cache=cache,
+                stream=args.stream,
+                schema=args.schema,
+                plan=plan,
+            )
+        elif len(args.diff) == 2:
+            old, new = args.diff
+            snapshots = [
+                parse_snapshot(
+                    fpath,
+                    cache=cache,
+                    stream=args.stream,
+                    schema=args.schema,
+                    plan=plan,
+                )
+                for fpath in args.diff
+            ]
+            changes = diff_articoli(
+                *snapshots,
+                snapshot_version(old),
+                snapshot_version(new),
+            )
+            write_changes(changes, args.outdir)
+            report = {k: len(changes[k]) for k in ("added", "removed", "modified")}
+        else:
+            parser.error("--diff richiede OLD NEW oppure --batch")
+        print(json.dumps(report, indent=1))
+    elif args.batch:
+        from .emitters import EMITTERS
+
+        formats = args.format or ["rst"]
+        for spec in formats:
+            fmt, sep, _ = spec.partition("=")
+            if fmt not in EMITTERS:
+                parser.error(f"Formato sconosciuto: {fmt}")
+            if sep:
+                parser.error(
+                    "Con --batch ogni formato e' scritto in OUTDIR/{dataVigenza}: "
+                    f"{spec} non e' supportato"
+                )
+        report = parse_batch(
+            find_snapshots(args.batch),
+            args.outdir,
+            workers=args.jobs,
+            cache=cache,
+            stream=args.stream,
+            incremental=args.incremental,
+            atomic=args.atomic,
+            index=index,
+            links=args.links,
+            schema=args.schema,
+            plan=plan,
+            formats=formats,
+        )
+        print(json.dumps(report, indent=1))
+    else:
+        from .store import read_snapshot
+
+        PROFILER.count("bytes_in", Path(args.xml).stat().st_size)
+        with PROFILER.stage("parse"):
+            if args.stream:
+                cadparser = CAD(source=args.xml, schema=args.schema, plan=plan)
+            else:
+                cadparser = CAD(
+                    text=read_snapshot(args.xml), schema=args.schema, plan=plan
+                )
+            writer = index.writer(args.xml) if index else None
+            cadparser.parse(workers=args.jobs, cache=cache, index=writer)
+            if writer:
+                writer.close()
+        with PROFILER.stage("dump"):
+            riferimenti = None
+            if args.links:
+                from .references import Riferimenti
+
+                riferimenti = Riferimenti(cadparser)
+            cadparser.emit(make_emitters(parser, args, riferimenti))
+    if cache:
+        cache.close()
+    if index:
+        index.close()
+    if args.profile:
+        PROFILER.dump(args.profile, cprofile=args.cprofile)
+
+
+def make_emitters(parser, args, riferimenti=None):
+    """Gli emettitori richiesti con --format."""
+    from .emitters import build_emitters
+
+    try:
+        return build_emitters(
+            args.format or ["rst"],
+            args.outdir,
+            args.xml,
+            incremental=args.incremental,
+            atomic=args.atomic,
+            riferimenti=riferimenti,
+        )
+    except ValueError as e:
+        parser.error(str(e))
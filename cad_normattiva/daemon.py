@@ -0,0 +1,450 @@
+"""
+Modalita' demone: tiene in memoria gli atti analizzati e li riformatta
+appena lo spider o `cad_normattiva.fetch` salvano un nuovo export.
+
+    python -m cad_normattiva.daemon docs/_rst/cad.xml docs/_acts/*/*.xml
+
+Ogni atto ha la sua directory di output, vedi `output_dir`: come per
+`--batch`, docs/_acts/{nome}/{nome}.xml viene scritto in
+docs/_acts/{nome}/_rst e docs/_acts/{nome}/{nome}-{dataVigenza}.xml in
+docs/_acts/{nome}/{dataVigenza}/_rst; docs/_rst/cad.xml in docs/_rst.
+Le directory vengono osservate con
+inotify (via ctypes, solo su Linux) o, in mancanza, controllando
+periodicamente dimensione, mtime e inode dei file. Le modifiche
+ravvicinate (es. i due file salvati da `save_act`) sono raggruppate:
+l'atto viene rielaborato solo dopo `--debounce` secondi di quiete.
+
+A ogni modifica gli articoli invariati non vengono riformattati (la
+cache resta in memoria) ne' riscritti su disco (`dump_index` in modo
+incrementale); con `--build` doc8 e sphinx ricevono solo i file cambiati.
+
+Lo stato e' disponibile in JSON su http://127.0.0.1:{--port}/status.
+"""
+import argparse
+import errno
+import json
+import logging
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from .diff import diff_articoli, snapshot_articoli
+from .formatter import BASEDIR, CAD, MemoryCache, snapshot_version
+from .store import read_snapshot
+
+log = logging.getLogger()
+
+# From <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_EVENT = struct.Struct("iIII")
+
+
+def inotify():
+    """La libc con le funzioni inotify, o None se non disponibili."""
+    if not sys.platform.startswith("linux"):
+        return None
+    import ctypes
+    import ctypes.util
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class PollingWatcher(object):
+    """Rileva le modifiche ai file `paths` confrontandone lo stat."""
+
+    def __init__(self, paths, interval=1.0):
+        self.paths = [Path(p) for p in paths]
+        self.interval = interval
+        self.state = {p: self.stat(p) for p in self.paths}
+
+    @staticmethod
+    def stat(fpath):
+        # Follows symlinks: relinking to a new store object changes the inode.
+        try:
+            st = fpath.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns, st.st_ino
+
+    def wait(self, timeout):
+        """:return: i file cambiati entro `timeout` secondi."""
+        time.sleep(min(self.interval, timeout))
+        changed = set()
+        for p in self.paths:
+            st = self.stat(p)
+            if st != self.state[p]:
+                self.state[p] = st
+                changed.add(p)
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Rileva le modifiche ai file `paths` con inotify, osservando le loro
+    directory: i file sostituiti con `os.replace` o ricreati cambiano inode.
+    Se la coda degli eventi si riempie tutti i file sono considerati
+    cambiati.
+
+    Se una directory viene rimossa (es. da `make clean`) o non esiste
+    ancora, viene osservata la prima directory padre esistente finche'
+    non viene ricreata; i file gia' presenti in quel momento sono
+    considerati cambiati.
+    """
+
+    # No IN_MODIFY: it fires on every write(), also for the files the daemon
+    # writes next to docs/_rst/cad.xml; writers close or rename the file.
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, paths, libc):
+        self.libc = libc
+        self.paths = {Path(p).absolute() for p in paths}
+        self.fd = libc.inotify_init1(IN_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            from ctypes import get_errno
+
+            raise OSError(get_errno(), "inotify_init1")
+        self.dirs = {}
+        self.missing = set()
+        try:
+            for d in {p.parent for p in self.paths}:
+                if not self.watch(d):
+                    self.missing.add(d)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def watch(self, d):
+        """
+        Osserva la directory `d` o, se non esiste, la prima directory padre
+        esistente.
+
+        :return: True se `d` e' osservata.
+        """
+        from ctypes import get_errno
+
+        for parent in (d, *d.parents):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(parent), self.MASK)
+            if wd >= 0:
+                self.dirs[wd] = parent
+                return parent == d
+            if get_errno() not in (errno.ENOENT, errno.ENOTDIR):
+                raise OSError(get_errno(), f"inotify_add_watch {parent}")
+        return False
+
+    def rewatch(self):
+        """
+        Osserva di nuovo le directory ricreate.
+
+        :return: i file presenti nelle directory ricreate.
+        """
+        changed = set()
+        for d in sorted(self.missing):
+            if self.watch(d):
+                log.info("%s di nuovo osservata", d)
+                self.missing.discard(d)
+                changed |= {p for p in self.paths if p.parent == d and p.exists()}
+        if not self.missing:
+            # Drop the watches on the parents.
+            dirs = {p.parent for p in self.paths}
+            for wd, d in list(self.dirs.items()):
+                if d not in dirs:
+                    self.libc.inotify_rm_watch(self.fd, wd)
+                    del self.dirs[wd]
+        return changed
+
+    def wait(self, timeout):
+        """:return: i file cambiati entro `timeout` secondi."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed, offset = set(), 0
+        while offset < len(data):
+            wd, mask, _, length = IN_EVENT.unpack_from(data, offset)
+            offset += IN_EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                log.warning("Coda inotify piena: rielaboro tutti gli atti")
+                changed |= self.paths
+            elif mask & IN_IGNORED:
+                # The directory was removed or unmounted.
+                d = self.dirs.pop(wd, None)
+                if d in {p.parent for p in self.paths}:
+                    log.warning("%s rimossa: attendo che venga ricreata", d)
+                    self.missing.add(d)
+            elif wd in self.dirs:
+                fpath = self.dirs[wd] / os.fsdecode(name)
+                if fpath in self.paths:
+                    changed.add(fpath)
+        if self.missing:
+            changed |= self.rewatch()
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(paths, interval=1.0, polling=False):
+    """Un `InotifyWatcher` se disponibile, altrimenti un `PollingWatcher`."""
+    libc = None if polling else inotify()
+    if libc is not None:
+        try:
+            return InotifyWatcher(paths, libc)
+        except OSError as e:
+            log.warning("inotify non disponibile (%s), uso il polling", e)
+    return PollingWatcher(paths, interval)
+
+
+def output_dir(source):
+    """
+    La directory in cui scrivere l'atto `source`: {atto}/_rst, dove {atto}
+    e' la directory del file XML, o la sua directory padre se questa e'
+    gia' una _rst (es. docs/_rst/cad.xml); le versioni
+    {nome}-{dataVigenza}.xml in {atto}/{dataVigenza}/_rst.
+    """
+    source = Path(source)
+    rst = Path(BASEDIR).name
+    root = source.parent.parent if source.parent.name == rst else source.parent
+    if source.match("*-[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9].xml"):
+        return root / snapshot_version(source) / rst
+    return root / rst
+
+
+class GenerationCache(MemoryCache):
+    """
+    Una `MemoryCache` che, a ogni `close`, conserva solo le voci usate
+    nell'ultima analisi: la memoria non cresce con le versioni dell'atto.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.previous = {}
+
+    def load(self, key):
+        value = self.previous.get(key)
+        if value is not None:
+            self.pending[key] = value
+        return value
+
+    def close(self):
+        self.previous, self.pending = self.pending, {}
+
+
+class Daemon(object):
+    """
+    Tiene in memoria un `CAD` per ogni file XML in `sources` e lo
+    riformatta in `output_dir` quando il file cambia.
+
+    :param debounce: i secondi senza modifiche da attendere prima di
+        rielaborare un atto.
+    :param publish: una funzione chiamata con i file scritti, es.
+        `build.publish` per eseguire doc8 e sphinx.
+    :param schema: le partizioni degli atti, vedi `CAD`.
+    """
+
+    def __init__(
+        self,
+        sources,
+        debounce=2.0,
+        links=False,
+        publish=None,
+        interval=1.0,
+        polling=False,
+        schema="cad",
+    ):
+        self.sources = [Path(s).absolute() for s in sources]
+        self.outdirs = {s: output_dir(s) for s in self.sources}
+        if len(set(self.outdirs.values())) < len(self.outdirs):
+            raise ValueError(
+                "Gli atti devono avere directory di output distinte: "
+                f"{sorted(map(str, self.outdirs.values()))}"
+            )
+        self.debounce = debounce
+        self.links = links
+        self.publish = publish
+        self.schema = schema
+        self.watcher = make_watcher(self.sources, interval, polling=polling)
+        self.snapshots = {}
+        self.caches = {s: GenerationCache() for s in self.sources}
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {"events": 0, "renders": 0, "errors": 0}
+        self.acts = {str(s): {} for s in self.sources}
+
+    def render(self, source):
+        """Analizza e riscrive l'atto: solo gli articoli cambiati sono riformattati."""
+        t0 = time.perf_counter()
+        cadparser = CAD(text=read_snapshot(source), schema=self.schema)
+        cache = self.caches[source]
+        cadparser.parse(cache=cache)
+        hits, misses = cache.hits, cache.misses
+        cache.hits = cache.misses = 0
+        cache.close()
+        outdir = self.outdirs[source]
+        outdir.mkdir(parents=True, exist_ok=True)
+        changed = cadparser.dump_index(outdir, incremental=True, links=self.links)
+        if self.publish:
+            self.publish(changed)
+
+        new = snapshot_articoli(cadparser)
+        old = self.snapshots.get(source)
+        changes = diff_articoli(old, new) if old else None
+        self.snapshots[source] = new
+        with self.lock:
+            self.counters["renders"] += 1
+            self.acts[str(source)] = {
+                "articoli": len(new),
+                "rendered": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seconds": round(time.perf_counter() - t0, 3),
+                "files_written": len(changed),
+                "reformatted": misses,
+                "reused": hits,
+                **(
+                    {
+                        k: [x["id"] for x in changes[k]]
+                        for k in ("added", "removed", "modified")
+                    }
+                    if changes
+                    else {}
+                ),
+            }
+        log.info("%s: %r", source, self.acts[str(source)])
+
+    def safe_render(self, source):
+        try:
+            self.render(source)
+        except Exception as e:
+            log.exception("Errore durante l'elaborazione di %s", source)
+            with self.lock:
+                self.counters["errors"] += 1
+                self.acts[str(source)]["error"] = repr(e)
+
+    def status(self):
+        with self.lock:
+            return {
+                "uptime": round(time.time() - self.started, 3),
+                "watcher": type(self.watcher).__name__,
+                **self.counters,
+                "acts": {k: dict(v) for k, v in self.acts.items()},
+            }
+
+    def run(self):
+        """Elabora tutti gli atti, poi attende le modifiche fino a `stop`."""
+        for source in self.sources:
+            if source.exists():
+                self.safe_render(source)
+        pending, last_event = set(), 0.0
+        while not self.stopping.is_set():
+            timeout = self.debounce if pending else 1.0
+            changed = self.watcher.wait(timeout)
+            now = time.monotonic()
+            if changed:
+                with self.lock:
+                    self.counters["events"] += len(changed)
+                pending |= changed
+                last_event = now
+            elif pending and now - last_event >= self.debounce:
+                for source in sorted(pending):
+                    if source.exists():
+                        self.safe_render(source)
+                pending.clear()
+        self.watcher.close()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+
+def serve_status(daemon, port, host="127.0.0.1"):
+    """Espone `daemon.status()` in JSON su http://host:port/status."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/status"):
+                self.send_error(404)
+                return
+            body = json.dumps(daemon.status(), indent=1).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("xml", nargs="*", default=["docs/_rst/cad.xml"])
+    parser.add_argument("--debounce", type=float, default=2.0)
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="Controlla periodicamente i file invece di usare inotify.",
+    )
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--links", action="store_true")
+    parser.add_argument("--schema", default="cad", help="Vedi cad-normattiva.")
+    parser.add_argument(
+        "--build",
+        action="store_true",
+        help="Esegue doc8 e sphinx-build sui file cambiati, vedi "
+        "cad_normattiva.build.",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    publish = None
+    if args.build:
+        from .build import publish
+
+    daemon = Daemon(
+        args.xml,
+        debounce=args.debounce,
+        links=args.links,
+        publish=publish,
+        interval=args.interval,
+        polling=args.polling,
+        schema=args.schema,
+    )
+    server = serve_status(daemon, args.port)
+    log.info("Stato su http://127.0.0.1:%d/status", server.server_port)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        daemon.run()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
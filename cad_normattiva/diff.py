@@ -0,0 +1,204 @@
+"""
+Differenze tra due versioni (snapshot cad-{dataVigenza}.xml) della norma.
+
+Gli articoli sono allineati per id (64, 64-bis, ...) e confrontati tramite
+lo sha1 del testo normalizzato: solo quelli con hash diverso vengono
+confrontati riga per riga e comma per comma.
+
+    cad-normattiva --diff cad-2020-01-01.xml cad-2021-01-01.xml --outdir DIR
+    cad-normattiva --batch docs/_acts/cad --diff --outdir DIR
+
+Per ogni coppia viene scritto il change set in JSON e una pagina RST.
+"""
+import difflib
+import hashlib
+import json
+import logging
+from collections import namedtuple
+from pathlib import Path
+
+from .emitters import rst_articolo
+from .formatter import CAD, MemoryCache, snapshot_version
+from .model import chiave_articolo, posizione, testo_blocchi
+from .rules import ACCENT_PLAN
+from .store import read_snapshot
+
+log = logging.getLogger()
+
+Voce = namedtuple("Voce", "posizione articolo digest")
+
+
+def digest(text):
+    """sha1 del testo con gli spazi normalizzati."""
+    return hashlib.sha1(" ".join(text.split()).encode()).hexdigest()
+
+
+def digest_articolo(articolo):
+    """Il `digest` del titolo e dei blocchi dell'articolo."""
+    return digest(f"{articolo.titolo}\n{testo_blocchi(articolo.blocchi)}")
+
+
+def snapshot_articoli(cadparser):
+    """
+    Gli articoli di un `CAD` gia' analizzato, indicizzati per id, con
+    la loro posizione (es. {"capo": "I", "sezione": ""}).
+    Gli id ripetuti diventano "id#2", "id#3", ..., vedi `chiave_articolo`.
+    """
+    ret, chiavi = {}, set()
+    for percorso, articolo in cadparser.iter_articoli():
+        ret[chiave_articolo(articolo, chiavi)] = Voce(
+            posizione(percorso, cadparser.schema), articolo, digest_articolo(articolo)
+        )
+    return ret
+
+
+def parse_snapshot(fpath, cache=None, stream=False, schema="cad", plan=ACCENT_PLAN):
+    if stream:
+        cadparser = CAD(source=fpath, schema=schema, plan=plan)
+    else:
+        cadparser = CAD(text=read_snapshot(fpath), schema=schema, plan=plan)
+    cadparser.parse(cache=cache)
+    return snapshot_articoli(cadparser)
+
+
+def diff_commi(old, new):
+    old_commi = {
+        c.id: digest(testo_blocchi(old.blocchi[c.start : c.end])) for c in old.commi
+    }
+    new_commi = {
+        c.id: digest(testo_blocchi(new.blocchi[c.start : c.end])) for c in new.commi
+    }
+    return {
+        "added": [c for c in new_commi if c not in old_commi],
+        "removed": [c for c in old_commi if c not in new_commi],
+        "modified": [
+            c for c in new_commi if c in old_commi and old_commi[c] != new_commi[c]
+        ],
+    }
+
+
+def diff_articoli(old, new, old_version="", new_version=""):
+    """
+    Confronta gli articoli di due versioni, restituiti da `snapshot_articoli`.
+
+    :return: il change set, serializzabile in JSON.
+    """
+
+    def ref(key, voce):
+        return {"id": key, **voce.posizione}
+
+    modified = []
+    for key, voce in new.items():
+        if key not in old or old[key].digest == voce.digest:
+            continue
+        before, after = old[key].articolo, voce.articolo
+        modified.append(
+            {
+                **ref(key, voce),
+                "commi": diff_commi(before, after),
+                "diff": list(
+                    difflib.unified_diff(
+                        rst_articolo(before).splitlines(),
+                        rst_articolo(after).splitlines(),
+                        old_version,
+                        new_version,
+                        n=1,
+                        lineterm="",
+                    )
+                ),
+            }
+        )
+    return {
+        "from": old_version,
+        "to": new_version,
+        "added": [ref(k, v) for k, v in new.items() if k not in old],
+        "removed": [ref(k, v) for k, v in old.items() if k not in new],
+        "modified": modified,
+    }
+
+
+def dove(ref):
+    """La posizione di un articolo nel change set, es. " (capo I, sezione II)"."""
+    parti = [f"{k} {v}" for k, v in ref.items() if k != "id" and v]
+    return f" ({', '.join(parti)})" if parti else ""
+
+
+def changelog_rst(changes):
+    """La pagina RST con il riepilogo del change set."""
+    title = f"Modifiche dal {changes['from']} al {changes['to']}"
+    txt = [title, "=" * (len(title) + 2), ""]
+    for label, key in (("Articoli aggiunti", "added"), ("Articoli rimossi", "removed")):
+        if changes[key]:
+            txt += [label, "-" * (len(label) + 2), ""]
+            txt += [f"- Art. {a['id']}{dove(a)}" for a in changes[key]]
+            txt += [""]
+    if changes["modified"]:
+        label = "Articoli modificati"
+        txt += [label, "-" * (len(label) + 2), ""]
+    for a in changes["modified"]:
+        heading = f"Art. {a['id']}"
+        txt += [heading, "^" * (len(heading) + 2), ""]
+        for verb, key in (
+            ("aggiunti", "added"),
+            ("rimossi", "removed"),
+            ("modificati", "modified"),
+        ):
+            if a["commi"][key]:
+                txt += [f"- Commi {verb}: {', '.join(a['commi'][key])}"]
+        txt += ["", ".. code-block:: diff", ""]
+        txt += [f"   {l}" if l else "" for l in a["diff"]]
+        txt += [""]
+    if len(txt) == 3:
+        txt += ["Nessuna modifica.", ""]
+    return "\n".join(txt) + "\n"
+
+
+def write_changes(changes, outdir):
+    """Scrive {from}_{to}.json e {from}_{to}.rst in `outdir`."""
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    stem = f"{changes['from']}_{changes['to']}"
+    (outdir / f"{stem}.json").write_text(json.dumps(changes, indent=1))
+    (outdir / f"{stem}.rst").write_text(changelog_rst(changes))
+    return outdir / f"{stem}.rst"
+
+
+def diff_history(
+    snapshots, outdir, cache=None, stream=False, schema="cad", plan=ACCENT_PLAN
+):
+    """
+    Confronta ogni snapshot con il precedente. Ogni versione viene
+    analizzata una sola volta e, grazie alla cache condivisa, gli articoli
+    invariati vengono formattati una sola volta in tutta la storia.
+
+    :return: per ogni coppia, le versioni e il numero di articoli
+        aggiunti, rimossi e modificati.
+    """
+    cache = cache or MemoryCache()
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    report, previous = [], None
+    for fpath in snapshots:
+        version = snapshot_version(fpath)
+        current = (
+            version,
+            parse_snapshot(fpath, cache=cache, stream=stream, schema=schema, plan=plan),
+        )
+        if previous:
+            changes = diff_articoli(previous[1], current[1], previous[0], version)
+            write_changes(changes, outdir)
+            report.append(
+                {
+                    "from": previous[0],
+                    "to": version,
+                    **{k: len(changes[k]) for k in ("added", "removed", "modified")},
+                }
+            )
+            log.info("Modifiche %s -> %s: %r", previous[0], version, report[-1])
+        previous = current
+
+    pages = "".join(f"   {r['from']}_{r['to']}\n" for r in reversed(report))
+    title = "Modifiche"
+    Path(outdir, "index.rst").write_text(
+        f"{title}\n{'=' * (len(title) + 2)}\n\n.. toctree::\n\n{pages}"
+    )
+    return report
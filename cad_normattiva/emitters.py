@@ -0,0 +1,324 @@
+"""
+Emettitori: scrivono il documento analizzato (`CAD.partizioni`) in un
+formato.
+
+L'analisi produce solo il modello (vedi `cad_normattiva.model`);
+`CAD.emit` lo percorre una sola volta e passa ogni partizione di primo
+livello a tutti gli emettitori, quindi una sola analisi produce tutti i
+formati:
+
+    cad-normattiva cad.xml --format rst --format html --format jsonl=-
+
+- `RstEmitter`: l'albero di file .rst per sphinx (`CAD.dump_index`);
+- `MarkdownEmitter`: un unico file Markdown;
+- `JsonlEmitter`: un oggetto JSON per articolo, una riga ciascuno,
+  es. per caricarlo in un motore di ricerca;
+- `HtmlEmitter`: un unico file HTML con l'indice delle partizioni.
+
+I formati su file singolo accettano un percorso oppure "-" per stdout.
+Il titolo e' quello dell'atto, vedi `Intestazione`.
+"""
+import html
+import json
+import sys
+from abc import ABC, abstractmethod
+from functools import partial
+from pathlib import Path
+
+from .formatter import BASEDIR, OutputWriter, index_header, mkfilename
+from .model import Partizione, posizione
+from .references import RIFERIMENTI
+
+
+class Emitter(ABC):
+    """
+    Interfaccia degli emettitori: `start` riceve il `CAD`, `partizione`
+    ogni partizione di primo livello nell'ordine del documento e `close`
+    restituisce il risultato.
+    """
+
+    def start(self, cad):
+        pass
+
+    @abstractmethod
+    def partizione(self, partizione):
+        pass
+
+    def close(self):
+        pass
+
+
+class StreamEmitter(Emitter):
+    """
+    Un emettitore che scrive su un solo file, o su stdout con "-".
+
+    :param titolo: il titolo del documento, di default quello dell'atto.
+    """
+
+    def __init__(self, target="-", titolo=None):
+        self.target = target
+        self.titolo = titolo
+        if target == "-":
+            self.out = sys.stdout
+        else:
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            self.out = open(target, "w")
+
+    def start(self, cad):
+        if self.titolo is None:
+            self.titolo = cad.intestazione.titolo or cad.intestazione.estremi
+
+    def write(self, text):
+        self.out.write(text)
+
+    def close(self):
+        if self.out is sys.stdout:
+            self.out.flush()
+            return None
+        self.out.close()
+        return Path(self.target)
+
+
+def commi(articolo):
+    """
+    Raggruppa i blocchi dell'articolo per comma, come `Articolo.commi`:
+    :return: una lista di (id, testo); i blocchi che precedono il primo
+        comma hanno id "".
+    """
+    ret = []
+    for numero, text in articolo.paragrafi():
+        if numero[:1].isdigit() and numero.endswith("."):
+            ret.append((numero[:-1], []))
+        elif not ret:
+            ret.append(("", []))
+        ret[-1][1].append(f"{numero} {text}".strip())
+    return [(id_, "\n".join(lines)) for id_, lines in ret]
+
+
+def rst_articolo(articolo, link=None):
+    """
+    Il file RST dell'articolo, cioe' il testo di `format_articolo`.
+
+    :param link: una funzione (indice del blocco, testo) -> testo, es.
+        `Riferimenti.link_rst`, applicata al testo di ogni blocco.
+    """
+    if not link:
+        return articolo.text
+    text, o = articolo.text, articolo.offsets
+    ret, pos = [], 0
+    for i in range(0, len(o), 3):
+        ret += [text[pos : o[i + 1]], link(i // 3, text[o[i + 1] : o[i + 2]])]
+        pos = o[i + 2]
+    ret.append(text[pos:])
+    return "".join(ret)
+
+
+class RstEmitter(Emitter):
+    """
+    I file .rst in `outdir`: l'indice in `outdir/../index.rst`, un file
+    per partizione e per articolo. Vedi `OutputWriter` per `incremental`
+    e `atomic`.
+
+    :param riferimenti: un `references.Riferimenti`: i riferimenti tra
+        articoli diventano link e il grafo viene salvato in
+        `outdir/riferimenti.json`.
+    """
+
+    def __init__(
+        self, outdir=BASEDIR, incremental=False, atomic=False, riferimenti=None
+    ):
+        self.outdir = outdir
+        self.dpath = Path(outdir)
+        self.writer = OutputWriter(self.dpath, incremental=incremental, atomic=atomic)
+        self.riferimenti = riferimenti
+
+    def relpath(self, fpath):
+        return str(fpath).replace(f"{self.outdir}/", "")
+
+    def start(self, cad):
+        # The index toctree is relative to the parent of outdir.
+        dname = self.dpath.absolute().name
+        self.writer.write(
+            self.dpath / ".." / "index.rst",
+            index_header(cad.intestazione)
+            + "".join(f"   {dname}/{p.nome}.rst\n" for p in cad.partizioni),
+        )
+        if self.riferimenti:
+            self.writer.write(self.dpath / RIFERIMENTI, self.riferimenti.to_json())
+
+    def partizione(self, partizione, percorso=()):
+        """
+        Scrive la partizione, con il toctree delle sottopartizioni e degli
+        articoli, e ricorsivamente i suoi figli.
+        """
+        percorso += (partizione,)
+        titolo = partizione.titolo
+        if len(percorso) == 1:
+            txt = [titolo, "=" * (len(titolo) + 2), "\n.. toctree::\n"]
+        else:
+            txt = [titolo, "-" * (len(titolo) + 2), "", partizione.intro]
+            txt += ["\n.. toctree::\n"]
+
+        for figlio in partizione.figli:
+            if isinstance(figlio, Partizione):
+                fpath = self.dpath / mkfilename(percorso + (figlio,))
+                self.partizione(figlio, percorso)
+                txt += [f"   {self.relpath(fpath)}"]
+                continue
+            fname = mkfilename(percorso, figlio.id)
+            link = None
+            if self.riferimenti:
+                link = partial(self.riferimenti.link_rst, fname[: -len(".rst")])
+            self.writer.write(self.dpath / fname, rst_articolo(figlio, link))
+            txt += [f"   {self.relpath(self.dpath / fname)}"]
+        self.writer.write(self.dpath / mkfilename(percorso), "\n".join(txt + ["", ""]))
+
+    def close(self):
+        """:return: la lista dei file scritti."""
+        return self.writer.close()
+
+
+def livello(percorso):
+    """Il livello dei titoli Markdown e HTML: 2 per le partizioni esterne."""
+    return min(len(percorso) + 1, 6)
+
+
+class MarkdownEmitter(StreamEmitter):
+    """Tutto il documento in un file Markdown, un titolo per articolo."""
+
+    def start(self, cad):
+        super().start(cad)
+        self.write(f"# {self.titolo}\n\n")
+
+    def partizione(self, partizione, percorso=()):
+        percorso += (partizione,)
+        self.write(f"{'#' * livello(percorso)} {partizione.titolo}\n\n")
+        for figlio in partizione.figli:
+            if isinstance(figlio, Partizione):
+                self.partizione(figlio, percorso)
+                continue
+            self.write(f"{'#' * livello(percorso + (figlio,))} {figlio.titolo}\n\n")
+            for numero, text in figlio.paragrafi():
+                if numero:
+                    text = f"**{numero}** {text}"
+                self.write(f"{text}\n\n")
+
+
+class JsonlEmitter(StreamEmitter):
+    """
+    Un oggetto JSON per riga e per articolo, con id, partizioni (l'id
+    della partizione per ogni livello dello schema, es. capo e sezione),
+    titolo, testo senza markup e commi.
+
+    Come gli altri emettitori, scrive solo dopo l'analisi dell'intero
+    documento, da `CAD.emit`; l'output viene svuotato dopo ogni partizione
+    di primo livello, cosi' chi legge da stdout riceve le righe durante
+    la scrittura e non solo alla fine.
+    """
+
+    def start(self, cad):
+        super().start(cad)
+        self.schema = cad.schema
+
+    def partizione(self, partizione):
+        for percorso, articolo in partizione.iter_articoli():
+            voce = {
+                "id": articolo.id,
+                "partizioni": posizione(percorso, self.schema),
+                "titolo": articolo.titolo,
+                "text": articolo.testo,
+                "commi": [
+                    {"id": id_, "text": text} for id_, text in commi(articolo) if id_
+                ],
+            }
+            self.write(json.dumps(voce, ensure_ascii=False) + "\n")
+        self.out.flush()
+
+
+class HtmlEmitter(StreamEmitter):
+    """Tutto il documento in un file HTML, con l'indice delle partizioni."""
+
+    def start(self, cad):
+        super().start(cad)
+        titolo = html.escape(self.titolo)
+        self.write(
+            "<!DOCTYPE html>\n"
+            '<html lang="it">\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{titolo}</title>\n</head>\n<body>\n"
+            f"<h1>{titolo}</h1>\n<nav>\n<ul>\n"
+        )
+        for p in cad.partizioni:
+            self.write(
+                f'<li><a href="#{html.escape(p.nome)}">'
+                f"{html.escape(p.titolo)}</a></li>\n"
+            )
+        self.write("</ul>\n</nav>\n")
+
+    def partizione(self, partizione, percorso=()):
+        percorso += (partizione,)
+        anchor = mkfilename(percorso)[: -len(".rst")]
+        h = livello(percorso)
+        self.write(
+            f'<section id="{html.escape(anchor)}">\n'
+            f"<h{h}>{html.escape(partizione.titolo)}</h{h}>\n"
+        )
+        for figlio in partizione.figli:
+            if isinstance(figlio, Partizione):
+                self.partizione(figlio, percorso)
+                continue
+            anchor = mkfilename(percorso, figlio.id)[: -len(".rst")]
+            h = livello(percorso + (figlio,))
+            self.write(
+                f'<article id="{html.escape(anchor)}">\n'
+                f"<h{h}>{html.escape(figlio.titolo)}</h{h}>\n"
+            )
+            for numero, text in figlio.paragrafi():
+                text = html.escape(text).replace("\n", "<br>\n")
+                if numero:
+                    text = f"<b>{html.escape(numero)}</b> {text}"
+                self.write(f"<p>{text}</p>\n")
+            self.write("</article>\n")
+        self.write("</section>\n")
+
+    def close(self):
+        self.write("</body>\n</html>\n")
+        return super().close()
+
+
+EMITTERS = {
+    "rst": RstEmitter,
+    "md": MarkdownEmitter,
+    "jsonl": JsonlEmitter,
+    "html": HtmlEmitter,
+}
+
+
+def build_emitters(
+    formats, outdir, source, incremental=False, atomic=False, riferimenti=None
+):
+    """
+    Gli emettitori dei `formats`, es. ["rst", "jsonl=-"] come l'opzione
+    --format: rst scrive in `outdir` (vedi `RstEmitter`), gli altri
+    formati in FILE o, di default, in outdir/../{nome di source}.{FMT}.
+
+    :raise ValueError: se un formato e' sconosciuto.
+    """
+    specs = [spec.partition("=")[::2] for spec in formats]
+    for fmt, _ in specs:
+        if fmt not in EMITTERS:
+            raise ValueError(f"Formato sconosciuto: {fmt}")
+    emitters = []
+    for fmt, target in specs:
+        if fmt == "rst":
+            emitters.append(
+                RstEmitter(
+                    outdir,
+                    incremental=incremental,
+                    atomic=atomic,
+                    riferimenti=riferimenti,
+                )
+            )
+            continue
+        target = target or Path(outdir, "..", Path(source).stem + f".{fmt}")
+        emitters.append(EMITTERS[fmt](target))
+    return emitters
@@ -0,0 +1,233 @@
+"""
+Scarica gli export XML da normattiva senza scrapy, con asyncio e aiohttp:
+adatto ai cron job, dove avviare il reactor di scrapy costa piu' delle
+tre richieste necessarie per ogni atto:
+
+1. la pagina della URN, da cui si ricavano codiceRedazionale e dataVigenza;
+2. la pagina vediMenuExport, con il form "anteprima";
+3. l'invio del form con il pulsante generaXml, che restituisce l'XML.
+
+    python -m cad_normattiva.fetch [--urns atti.txt] [--force] [--offline]
+
+I file salvati sono gli stessi dello spider scrapy/normattiva.py.
+Tutti gli atti condividono un pool di connessioni keep-alive; ognuno ha
+la propria sessione (cookie jar), come i cookiejar dello spider.
+"""
+import argparse
+import asyncio
+import logging
+import random
+from urllib.parse import urljoin
+
+from .acts import (
+    BASEURL,
+    STATE,
+    FetchState,
+    export_url,
+    make_acts,
+    parse_atto,
+    replay_act,
+    save_act,
+)
+from .store import STOREDIR, SnapshotStore
+
+log = logging.getLogger()
+
+# Responses worth retrying; other errors fail the act immediately.
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def selector(text):
+    from parsel import Selector
+
+    return Selector(text=text, type="html")
+
+
+def form_request(html, url, formid, clickname):
+    """
+    Il metodo, l'URL e i dati del form `formid`, inviato con il pulsante
+    `clickname`, come `scrapy.FormRequest.from_response`.
+    """
+    form = selector(html).xpath(f'//form[@id="{formid}"]')[0]
+    data = []
+    for e in form.xpath(".//input[@name]|.//select[@name]|.//textarea[@name]"):
+        name, tag = e.attrib["name"], e.root.tag
+        kind = e.attrib.get("type", "text").lower()
+        if tag == "select":
+            value = e.xpath(".//option[@selected]/@value").get() or e.xpath(
+                ".//option/@value"
+            ).get("")
+        elif tag == "textarea":
+            value = e.xpath("text()").get("")
+        elif kind in ("submit", "image", "button", "reset"):
+            if name != clickname:
+                continue
+            value = e.attrib.get("value", "")
+        elif kind in ("checkbox", "radio") and "checked" not in e.attrib:
+            continue
+        else:
+            value = e.attrib.get("value", "")
+        data.append((name, value))
+    action = urljoin(url, form.attrib.get("action") or url)
+    return form.attrib.get("method", "GET").upper(), action, data
+
+
+class Fetcher(object):
+    """
+    Scarica gli atti con al massimo `concurrency` atti in corso e
+    `retries` tentativi per richiesta, con backoff esponenziale.
+    """
+
+    def __init__(
+        self,
+        acts,
+        state,
+        baseurl=None,
+        force=False,
+        concurrency=4,
+        retries=3,
+        backoff=1.0,
+        timeout=60,
+        store=None,
+    ):
+        self.acts = acts
+        self.state = state
+        self.baseurl = BASEURL
+        if baseurl:
+            self.baseurl = baseurl.rstrip("/") + "/uri-res/N2Ls?"
+        self.force = force
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.store = store
+
+    async def request(self, session, method, url, **kwargs):
+        """Esegue la richiesta e restituisce (url finale, body)."""
+        import aiohttp
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    if response.status not in RETRY_STATUS:
+                        response.raise_for_status()
+                        return str(response.url), await response.read()
+                    error = f"HTTP {response.status}"
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            if attempt == self.retries:
+                raise RuntimeError(f"{method} {url}: {error}")
+            delay = self.backoff * 2**attempt * (1 + random.random())
+            log.warning(
+                "%s %s: %s, nuovo tentativo in %.1fs", method, url, error, delay
+            )
+            await asyncio.sleep(delay)
+
+    async def fetch(self, session, act):
+        """
+        :return: True se l'export e' stato scaricato, False se e' invariato.
+        """
+        url, body = await self.request(session, "GET", self.baseurl + act["urn"])
+        text = body.decode()
+        act.update(parse_atto(selector(text), text))
+        log.info(
+            "Trovate le seguenti informazioni per %s: %s, %s, %s",
+            act["name"],
+            act["codiceRedazionale"],
+            act["dataPubblicazioneGazzetta"],
+            act["dataVigenza"],
+        )
+        if not self.force and self.state.is_unchanged(act["urn"], act):
+            log.info("%s e' invariato, salto l'export", act["name"])
+            return False
+
+        url, body = await self.request(session, "GET", urljoin(url, export_url(act)))
+        method, action, data = form_request(
+            body.decode(), url, "anteprima", "generaXml"
+        )
+        if method == "POST":
+            url, body = await self.request(session, method, action, data=data)
+        else:
+            url, body = await self.request(session, method, action, params=data)
+        save_act(act, body, self.state, store=self.store)
+        log.info("Salvato %s da %s", act["name"], url)
+        return True
+
+    async def run(self):
+        """
+        :return: per ogni atto, True se scaricato, False se invariato,
+            o l'eccezione che ne ha impedito il download.
+        """
+        import aiohttp
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency * 2)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async def fetch_one(act):
+            async with semaphore, aiohttp.ClientSession(
+                connector=connector,
+                connector_owner=False,
+                cookie_jar=aiohttp.CookieJar(unsafe=True),
+                timeout=timeout,
+            ) as session:
+                return await self.fetch(session, act)
+
+        async with connector:
+            results = await asyncio.gather(
+                *(fetch_one(act) for act in self.acts), return_exceptions=True
+            )
+        for act, result in zip(self.acts, results):
+            if isinstance(result, Exception):
+                log.error("Download di %s fallito: %s", act["name"], result)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--urns", help="File con le URN da scaricare.")
+    parser.add_argument("--outdir", default="docs/_acts")
+    parser.add_argument("--state", default=STATE)
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Non accede alla rete e ripristina gli export salvati.",
+    )
+    parser.add_argument("--baseurl", help="Server alternativo a normattiva.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument(
+        "--store",
+        nargs="?",
+        const=STOREDIR,
+        help=f"Salva gli export compressi e deduplicati (default: {STOREDIR}).",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    acts = make_acts(args.urns, args.outdir)
+    state = FetchState(args.state)
+    store = SnapshotStore(args.store) if args.store else None
+    if args.offline:
+        for act in acts:
+            replay_act(act, state, store=store)
+        return
+
+    results = asyncio.run(
+        Fetcher(
+            acts,
+            state,
+            baseurl=args.baseurl,
+            force=args.force,
+            concurrency=args.concurrency,
+            retries=args.retries,
+            store=store,
+        ).run()
+    )
+    if any(isinstance(r, Exception) for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1080 @@
+"""
+Formatta l'export XML di una norma di normattiva in file .rst per sphinx.
+
+Il modulo importa lxml e parsel solo quando servono, cosi' che la CLI
+(cad_normattiva.cli) parta velocemente.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future
+from contextlib import nullcontext
+from functools import partial
+from pathlib import Path
+
+from .model import Articolo, Intestazione, Partizione
+from .profiler import PROFILER
+from .rules import (
+    ACCENT_PLAN,
+    RE_A_CAPO,
+    RE_CAPO_TESTO,
+    RE_COMMA,
+    RE_DASHES,
+    RE_DATA_VIGENZA,
+    RE_NEWLINES,
+    RE_PARENS,
+    RE_PUNTO,
+    get_schema,
+    re_partizione,
+)
+from .store import is_compressed, open_snapshot, read_snapshot
+
+log = logging.getLogger()
+
+BASEDIR = "docs/_rst"
+CACHEDIR = "docs/_cache"
+SEARCHDB = f"{CACHEDIR}/search.sqlite"
+
+# Changes to the formatter invalidate the ParseCache.
+FORMATTER_VERSION = hashlib.sha1(
+    b"".join(
+        (Path(__file__).parent / f).read_bytes() for f in ("formatter.py", "rules.py")
+    )
+).hexdigest()
+
+
+def index_header(intestazione):
+    """L'inizio di index.rst: il titolo e gli estremi dell'atto, poi il toctree."""
+    txt = [""]
+    for line in (intestazione.titolo, intestazione.estremi):
+        if line:
+            txt += [line, "#" * len(line), ""]
+    return "\n".join(txt + [".. toctree::", "", ""])
+
+
+def replace_accents(l, plan=ACCENT_PLAN):
+    """Applica le sostituzioni di `plan`, senza le correzioni a inizio e fine riga."""
+    return plan.replace(l)
+
+
+def fix_accent(l, plan=ACCENT_PLAN):
+    """
+    Sostituisce apostrofo con l'accento in parole che finiscono per vocale.
+    Es: liberta' -> libertà
+    Po', po', è vengono ripristinati nella versione corretta
+
+    Ogni gruppo di sostituzioni di `plan` viene applicato solo se la riga
+    contiene il suo carattere (es. l'apostrofo).
+
+    :param plan: le regole compilate con `compile_accent_rules`.
+    """
+    l = plan.replace(l)
+    if l[-2:] == " é":
+        l = l[:-1] + "è"
+    if l[0:2] == "é ":
+        l = "è" + l[1:]
+
+    return l
+
+
+def parse_articolo(a, plan=ACCENT_PLAN):
+    """
+    <articolo id="19">
+        <num>Art. 19.</num>
+        <comma id="art19-com1">
+        <num>1</num>
+        <corpo>
+            <h:p h:style="text-align: center;">Art. 20 </h:p>
+            <h:p h:style="text-align: center;">Validita' ed efficacia probatoria dei documenti informatici </h:p>
+            <h:br/>
+            <h:p h:style="text-align: center;">((ARTICOLO ABROGATO DAL D.LGS. 26 AGOSTO 2016, N. 179)) </h:p>
+        </corpo>
+        </comma>
+    </articolo>
+    """
+    return format_articolo(articolo_lines(a), plan)
+
+
+def articolo_lines(a):
+    """Le righe di testo dell'articolo: l'unico input di `format_articolo`."""
+    return [x.extract() for x in a.xpath(".//corpo/p/text()")]
+
+
+def iter_blocchi(lines):
+    """
+    Normalizza le righe di un articolo, classificando ogni riga una volta:
+
+    - le righe fatte di trattini diventano "\\n";
+    - rimuove le doppie parentesi a inizio / fine riga;
+    - le righe 'qualcosa) ...' o 'qualcosa. ...' sono commi o punti.
+
+    Restituisce (numero, testo) per ogni riga, dove numero e' es. "1."
+    o "a)" per commi e punti e "" per le altre righe.
+    E' un generatore: il costo e' lineare nel numero di righe.
+    """
+    for l in lines:
+        l = RE_PARENS.sub("", RE_DASHES.sub("\n", l).strip(" "))
+        m = RE_COMMA.match(l)
+        if m:
+            yield f"{m.group(1)})", l[m.end() :]
+            continue
+        m = RE_PUNTO.match(l)
+        if m:
+            yield f"{m.group(1)}.", l[m.end() :]
+        else:
+            yield "", l
+
+
+def iter_righe_rst(blocchi):
+    """
+    Le righe RST dei blocchi di `iter_blocchi`, come (marcatore, numero,
+    testo), dove marcatore e' es. "\\n  1\\. " per commi e punti e ""
+    per le altre righe; le righe vuote che chiudono le liste hanno
+    marcatore None.
+    """
+    numbered = False
+    for numero, testo in blocchi:
+        if numbered and not numero:
+            yield None, "", "\n"
+        yield (f"\n  {numero[:-1]}\\{numero[-1]} " if numero else ""), numero, testo
+        numbered = bool(numero)
+
+
+def format_articolo(lines, plan=ACCENT_PLAN):
+    """
+    Formatta le righe di un articolo in RST: commi e punti diventano liste
+    numerate, es. "  1\\. testo", separate da una riga vuota; una riga
+    vuota chiude la lista prima del testo che la segue.
+
+    :param plan: le regole degli accenti, vedi `fix_accent`.
+
+    :return: (intro, testo, offset), dove intro e' il testo RST delle
+        eventuali righe che precedono "Art. ..." (es. il titolo del capo)
+        o None e offset contiene, per ogni riga del corpo come in
+        `iter_blocchi`, l'inizio del numero e l'inizio e la fine del testo
+        (vedi `Articolo.blocchi`).
+    """
+    blocchi = list(iter_blocchi(lines))
+    for i, (numero, testo) in enumerate(blocchi):
+        if not numero and testo.startswith("Art"):
+            break
+    intro = None
+    if i:
+        righe = [(m or "") + t for m, _, t in iter_righe_rst(blocchi[:i])]
+        if blocchi[i - 1][0]:
+            # Close the list before the article.
+            righe.append("\n")
+        intro = fix_accent("\n".join(righe + ["\n"]), plan)
+
+    (_, art), (_, headline), *body = blocchi[i:]
+    titolo = art + ". " + headline.strip("().")
+    righe = [replace_accents(titolo, plan), "^" * len(titolo), ""]
+    if intro is None:
+        # One "\n" per line break, whatever the separators in the source.
+        righe[0] = RE_A_CAPO.sub("\n", righe[0])
+    offsets, pos = array("I"), len(righe[0]) + len(titolo) + 3
+    for marker, numero, testo in iter_righe_rst(body):
+        if marker is None:
+            righe.append(testo)
+            pos += len(testo) + 1
+            continue
+        # The rules see the space after a number, as in the line "1. testo".
+        testo = (
+            replace_accents(f" {testo}", plan)[1:]
+            if numero
+            else replace_accents(testo, plan)
+        )
+        if intro is None:
+            testo = RE_A_CAPO.sub("\n", testo)
+        start = pos + len(marker)
+        offsets.extend((pos + 3 if numero else start, start, start + len(testo)))
+        righe.append(marker + testo)
+        pos = start + len(testo) + 1
+    text = "\n".join(righe + ["\n"])
+    # Without an intro the text ends with a single blank line.
+    return intro, (text[:-1] if intro is None else text), offsets
+
+
+def timed_format_articolo(lines, plan=ACCENT_PLAN):
+    """
+    `format_articolo` eseguito nel pool di processi di `CAD.parse`:
+    restituisce anche i secondi impiegati, per `Profiler.add_article`.
+    """
+    t0 = time.perf_counter()
+    value = format_articolo(lines, plan)
+    return value, time.perf_counter() - t0
+
+
+def mkfilename(percorso, art_id=None):
+    """
+    Il file di una partizione o di un articolo, es.
+    capo_I-sezione_II-articolo_5.rst.
+
+    :param percorso: le `Partizione` dalla piu' esterna.
+    """
+    nomi = [p.nome for p in percorso]
+    if art_id is not None:
+        nomi.append(f"articolo_{art_id}")
+    return "-".join(nomi) + ".rst"
+
+
+def localname(e):
+    return e.tag.rpartition("}")[2]
+
+
+def strip_namespaces(e):
+    """Rimuove i namespace dai tag, così le XPath di `parse_articolo` funzionano."""
+    for x in e.iter():
+        if isinstance(x.tag, str):
+            x.tag = localname(x)
+    return e
+
+
+def direct_text(e):
+    """
+    Equivalente streaming di `e.xpath("text()")`: il testo dell'elemento
+    e le code dei suoi figli.
+    """
+    return (e.text or "") + "".join(c.tail or "" for c in e)
+
+
+def parse_intestazione(e, plan=ACCENT_PLAN):
+    """I metadati dell'atto dall'elemento lxml <intestazione>, XML o HTML."""
+    campi = {
+        "tipodoc": "tipo",
+        "datadoc": "data",
+        "numdoc": "numero",
+        "titolodoc": "titolo",
+    }
+    ret = Intestazione()
+    for x in e.iter():
+        campo = campi.get(localname(x).lower()) if isinstance(x.tag, str) else None
+        if campo:
+            setattr(ret, campo, " ".join("".join(x.itertext()).split()))
+    ret.titolo = fix_accent(ret.titolo.rstrip(". "), plan)
+    return ret
+
+
+def iterparse_struttura(source, schema, plan=ACCENT_PLAN):
+    """
+    Legge il documento con un parser incrementale e restituisce, come
+    `CAD.iter_struttura`:
+
+    - ("intestazione", intestazione) alla chiusura di <intestazione>;
+    - ("partizione", text) per ogni elemento dello schema (es. <capo>)
+      appena ne e' stata letta l'intestazione, cioe' all'apertura del
+      primo articolo o sottopartizione, o alla sua chiusura;
+    - ("articolo", selector) alla chiusura di ogni <articolo> contenuto
+      in una partizione;
+    - ("chiusura", annidata) alla chiusura di ogni elemento dello schema,
+      dove annidata e' True se e' contenuto in un altro.
+
+    Ogni sottoalbero viene liberato dopo l'uso, quindi la memoria
+    occupata non dipende dalla dimensione del documento.
+    Il testo dell'intestazione e' lo stesso calcolato da `parse_capo`.
+    """
+    from lxml import etree
+    from parsel import Selector
+
+    tags = set(schema)
+    # The elements that end the heading of the partition containing them.
+    end = tags | {"articolo"}
+    # Only the structural elements are reported: the heading of a partition
+    #  is the text of its children that precede the first of them.
+    events = etree.iterparse(
+        source,
+        events=("start", "end"),
+        tag=[f"{{*}}{t}" for t in (*end, "intestazione")],
+        huge_tree=True,
+    )
+    # The open partitions whose heading has not been returned yet.
+    intestazioni = set()
+    depth = 0
+    for event, e in events:
+        tag = localname(e)
+        if event == "start":
+            if intestazioni and tag in end:
+                parent = next((x for x in e.iterancestors() if x in intestazioni), None)
+                if parent is not None:
+                    # The element being parsed is the last child of its ancestors.
+                    intestazioni.discard(parent)
+                    text = "".join(direct_text(c) for c in parent[:-1])
+                    yield "partizione", format_capo(text, plan)
+            if tag in tags:
+                intestazioni.add(e)
+                depth += 1
+            continue
+
+        if tag == "intestazione":
+            yield "intestazione", parse_intestazione(e, plan)
+            continue
+        if tag == "articolo":
+            if depth:
+                yield "articolo", Selector(root=strip_namespaces(e), type="xml")
+        else:
+            if e in intestazioni:
+                intestazioni.discard(e)
+                text = "".join(direct_text(c) for c in e)
+                yield "partizione", format_capo(text, plan)
+            depth -= 1
+            yield "chiusura", depth > 0
+        e.clear(keep_tail=True)
+        while e.getprevious() is not None:
+            del e.getparent()[0]
+
+
+def xpath_struttura(schema):
+    """
+    L'XPath che seleziona, in un solo passaggio e nell'ordine del
+    documento, l'intestazione, le partizioni e gli articoli, come
+    `iterparse_struttura`.
+    """
+    # A union of name tests: libxml2 scans the tree once per name, much
+    #  faster than a single //*[self::a or self::b] filter.
+    partizioni = "".join(f"|//{t}" for t in schema)
+    dentro = " or ".join(f"ancestor::{t}" for t in schema)
+    return f"//intestazione{partizioni}|//articolo[{dentro}]"
+
+
+class Struttura(object):
+    """
+    Costruisce in un solo passaggio l'albero delle `Partizione`: `apri`
+    riceve l'intestazione di ogni partizione, gia' formattata da
+    `format_capo`, e `aggiungi` ogni articolo, nell'ordine del documento.
+    Le partizioni aperte sono una pila, quindi il costo e' lineare
+    qualunque sia la profondita' dello schema.
+
+    Un'intestazione puo' aprire piu' livelli, es. "Capo I ... Sezione I
+    ...": il primo e' all'inizio del testo, gli altri lo seguono
+    nell'ordine dello schema. Un'intestazione senza livelli chiude
+    l'ultimo livello (es. la sezione), se aperto. Le intestazioni ripetute
+    riaprono la stessa partizione, che prende l'ultimo titolo.
+
+    `chiudi` riceve la chiusura di ogni elemento: se e' annidato in
+    un'altra partizione (es. <capo> in <titolo>) chiude i livelli che ha
+    aperto, come nell'XML. Gli elementi non annidati, come i <capo>
+    consecutivi esportati da normattiva, restano aperti fino alla
+    prossima intestazione dello stesso livello o di uno piu' esterno.
+
+    :param schema: i livelli dal piu' esterno, vedi `rules.get_schema`.
+    :param index: un `search.IndexWriter` da aggiornare con ogni articolo.
+    """
+
+    def __init__(self, schema="cad", index=None):
+        self.schema = get_schema(schema)
+        self.regex = [re_partizione(tipo) for tipo in self.schema]
+        self.index = index
+        self.partizioni = []
+        # The open partitions, as (livello, Partizione), outermost first.
+        self.aperte = []
+        # Every partition by file name, to merge repeated headings.
+        self.nomi = {}
+        # For each element being read, the length of `aperte` before the
+        #  levels it opened.
+        self.inizi = []
+
+    @property
+    def percorso(self):
+        return tuple(p for _, p in self.aperte)
+
+    def livelli(self, text):
+        """:return: (livello, id, titolo) per ogni livello aperto da `text`."""
+        found, pos = [], 0
+        for livello, regex in enumerate(self.regex):
+            m = regex.search(text, pos) if found else regex.match(text)
+            if m:
+                found.append((livello, m))
+                pos = m.end()
+        ends = [m.start() for _, m in found[1:]] + [len(text)]
+        return [
+            (livello, m.group(1), text[m.start() : end])
+            for (livello, m), end in zip(found, ends)
+        ]
+
+    def apri(self, text):
+        livelli = self.livelli(text) if text else []
+        if text and not livelli:
+            if self.aperte and self.aperte[-1][0] == len(self.schema) - 1:
+                self.aperte.pop()
+        while livelli and self.aperte and self.aperte[-1][0] >= livelli[0][0]:
+            self.aperte.pop()
+        self.inizi.append(len(self.aperte))
+        if not livelli:
+            return
+        for livello, id_, titolo in livelli:
+            p = Partizione(self.schema[livello], id_, titolo)
+            nome = mkfilename(self.percorso + (p,))
+            if nome in self.nomi:
+                # A repeated heading, e.g. "Capo I" then "Capo I ... Sezione I".
+                p = self.nomi[nome]
+                p.titolo = titolo
+            else:
+                self.nomi[nome] = p
+                figli = self.aperte[-1][1].figli if self.aperte else self.partizioni
+                figli.append(p)
+            self.aperte.append((livello, p))
+        log.debug("%s: [%s]", mkfilename(self.percorso), text)
+
+    def chiudi(self, annidata=False):
+        inizio = self.inizi.pop()
+        if annidata:
+            del self.aperte[inizio:]
+
+    def aggiungi(self, articolo, intro=None):
+        if not self.aperte:
+            log.warning("Articolo %s fuori dalle partizioni, ignorato", articolo.id)
+            return
+        partizione = self.aperte[-1][1]
+        partizione.figli.append(articolo)
+        if intro:
+            partizione.intro = intro
+        if self.index:
+            self.index.add(self.percorso, articolo)
+
+
+class MemoryCache(object):
+    """
+    Cache in memoria dei risultati di `format_articolo`, indicizzati per
+    sha1 delle righe dell'articolo. Vedi `ParseCache` per la versione su disco.
+
+    Conserva al piu' `max_entries` voci: oltre vengono rimosse quelle
+    usate meno di recente, cosi' la memoria non cresce con il numero di
+    versioni analizzate (es. `parse_batch`).
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self.pending = {}
+
+    @staticmethod
+    def key(lines, plan=ACCENT_PLAN):
+        """La chiave delle righe di un articolo formattate con `plan`."""
+        return hashlib.sha1("\0".join([plan.digest, *lines]).encode()).hexdigest()
+
+    def load(self, key):
+        return None
+
+    def get(self, key):
+        value = self.pending.pop(key, None)
+        if value is None:
+            value = self.load(key)
+        else:
+            # Move the entry to the end: the dict is kept in LRU order.
+            self.pending[key] = value
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.pending[key] = value
+        if len(self.pending) > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        del self.pending[next(iter(self.pending))]
+
+    def close(self):
+        pass
+
+
+class ParseCache(MemoryCache):
+    """
+    Cache su disco dei risultati di `format_articolo`, indicizzati per sha1
+    delle righe dell'articolo: tra due date di vigenza la maggior parte
+    degli articoli e' identica e non va riformattata.
+
+    Le voci sono salvate in sqlite; oltre `max_entries` vengono rimosse
+    quelle usate meno di recente. Se cambia `version` (di default l'hash
+    del formattatore) la cache viene svuotata. Le nuove voci restano in
+    memoria fino a `close`, o finche' non sono piu' di `FLUSH`. L'intro,
+    il testo e gli offset sono salvati in JSON.
+    """
+
+    FLUSH = 10000
+
+    def __init__(self, path=CACHEDIR, max_entries=100000, version=None):
+        path = Path(path)
+        if path.suffix != ".sqlite":
+            path = path / "articoli.sqlite"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.version = version or FORMATTER_VERSION
+        super().__init__(max_entries)
+        self.used = {}
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (version TEXT);
+            CREATE TABLE IF NOT EXISTS articoli (
+                key TEXT PRIMARY KEY, intro TEXT, text TEXT, used INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS articoli_used ON articoli (used);
+            """
+        )
+        row = self.db.execute("SELECT version FROM meta").fetchone()
+        if not row or row[0] != self.version:
+            log.info("Invalidating parse cache %s", path)
+            with self.db:
+                self.db.execute("DELETE FROM articoli")
+                self.db.execute("DELETE FROM meta")
+                self.db.execute("INSERT INTO meta VALUES (?)", (self.version,))
+
+    def load(self, key):
+        row = self.db.execute(
+            "SELECT intro, text FROM articoli WHERE key = ?", (key,)
+        ).fetchone()
+        if row:
+            self.used[key] = time.time_ns()
+            intro, (text, offsets) = (json.loads(x) for x in row)
+            return intro, text, array("I", offsets)
+
+    def put(self, key, value):
+        """Le nuove voci sono scritte su disco da `flush`."""
+        self.pending[key] = value
+        if len(self.pending) >= self.FLUSH:
+            self.flush()
+
+    def flush(self):
+        """Scrive su disco le nuove voci e gli accessi e le rimuove dalla memoria."""
+        now = time.time_ns()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO articoli VALUES (?, ?, ?, ?)",
+                (
+                    (k, json.dumps(intro), json.dumps([text, list(offsets)]), now)
+                    for k, (intro, text, offsets) in self.pending.items()
+                ),
+            )
+            self.db.executemany(
+                "UPDATE articoli SET used = ? WHERE key = ?",
+                ((used, k) for k, used in self.used.items()),
+            )
+        self.pending, self.used = {}, {}
+
+    def close(self):
+        self.flush()
+        with self.db:
+            self.db.execute(
+                "DELETE FROM articoli WHERE key IN ("
+                " SELECT key FROM articoli ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        self.db.close()
+        log.info("Parse cache: %d hits, %d misses", self.hits, self.misses)
+
+
+class OutputWriter(object):
+    """
+    Raccoglie i file generati da `CAD.dump_index` e li scrive alla
+    chiusura con un pool di thread.
+
+    In modalita' incrementale confronta lo sha1 del nuovo contenuto con
+    quello registrato nel manifest `outdir/.manifest.json` e riscrive solo i
+    file cambiati, così sphinx-build non rielabora le pagine invariate.
+    Alla chiusura rimuove i file generati in precedenza e non piu' prodotti
+    (es. articoli abrogati).
+
+    In modalita' atomica i file vengono scritti in una nuova directory
+    `outdir.{timestamp}`, dove i file invariati o non generati (es. cad.xml)
+    sono collegati con un hard link; `outdir` diventa poi un link simbolico
+    alla nuova directory, sostituito con un singolo `os.replace`: chi legge
+    `outdir` (sphinx, rsync) non vede mai un albero scritto a meta'. I file
+    fuori da `outdir` (es. `outdir/../index.rst`) vengono sostituiti con
+    `os.replace` subito dopo, cosi' non puntano mai a file non ancora
+    pubblicati. La directory precedente viene rimossa solo all'esecuzione
+    successiva.
+    """
+
+    MANIFEST = ".manifest.json"
+
+    def __init__(self, outdir, incremental=False, atomic=False, workers=8):
+        self.outdir = Path(outdir)
+        self.incremental = incremental
+        self.atomic = atomic
+        self.workers = workers
+        self.files = {}
+        self.manifest = {}
+        self.entries = {}
+        self.changed = []
+        self.removed = []
+        self.deferred = []
+        manifest = self.outdir / self.MANIFEST
+        if incremental and manifest.exists():
+            self.manifest = json.loads(manifest.read_text())
+
+    def is_unchanged(self, fpath, key, digest):
+        try:
+            st = fpath.stat()
+        except FileNotFoundError:
+            return False
+        if self.manifest.get(key) == [digest, st.st_size, st.st_mtime_ns]:
+            return True
+        # No (valid) manifest entry: compare with the content on disk.
+        return hashlib.sha1(fpath.read_bytes()).hexdigest() == digest
+
+    def write(self, fpath, text):
+        """Il file viene scritto da `close`."""
+        self.files[Path(fpath)] = text
+
+    def _flush(self, item):
+        fpath, text = item
+        key = os.path.relpath(fpath, self.outdir)
+        digest = hashlib.sha1(text.encode()).hexdigest()
+        changed = not (self.incremental and self.is_unchanged(fpath, key, digest))
+        dest = fpath
+        if self.atomic and key.startswith(".."):
+            # Outside the staging tree (e.g. ../index.rst): written next to
+            #  fpath and renamed over it after the swap.
+            target = Path(os.path.normpath(fpath))
+            dest = target.with_name(f".{target.name}.tmp")
+            if changed:
+                self.deferred.append((dest, target))
+            else:
+                dest = fpath
+        elif self.atomic:
+            dest = self.staging / key
+            if not changed:
+                os.link(fpath, dest)
+        if changed:
+            if dest is fpath:
+                replace_text(dest, text)
+            else:
+                dest.write_text(text)
+        st = dest.stat()
+        return fpath, key, changed, [digest, st.st_size, st.st_mtime_ns]
+
+    def _stage(self):
+        """Collega nella directory di staging i file non generati."""
+        self.staging = self.outdir.with_name(f"{self.outdir.name}.{time.time_ns()}")
+        self.staging.mkdir()
+        if not self.outdir.exists():
+            return
+        generated = {os.path.relpath(f, self.outdir) for f in self.files}
+        skip = generated | set(self.manifest) | {self.MANIFEST}
+        for f in self.outdir.iterdir():
+            if f.name in skip:
+                continue
+            if f.is_dir():
+                shutil.copytree(f, self.staging / f.name, copy_function=os.link)
+            else:
+                os.link(f, self.staging / f.name)
+
+    def generations(self):
+        """Le directory `outdir.{timestamp}` scritte dalle esecuzioni atomiche."""
+        for d in self.outdir.parent.glob(f"{self.outdir.name}.*"):
+            suffix = d.name[len(self.outdir.name) + 1 :]
+            if (suffix.isdigit() or suffix == "old") and not d.is_symlink():
+                yield d
+
+    def _swap(self):
+        """
+        Sostituisce `outdir` con un link alla directory di staging. La
+        generazione precedente resta su disco fino all'esecuzione
+        successiva, per chi la sta ancora leggendo; le altre sono rimosse.
+        """
+        link = self.outdir.with_name(f"{self.outdir.name}.link")
+        link.unlink(missing_ok=True)
+        os.symlink(self.staging.name, link)
+        if self.outdir.is_symlink() or not self.outdir.exists():
+            previous = self.outdir.resolve() if self.outdir.is_symlink() else None
+            os.replace(link, self.outdir)
+        else:
+            # First atomic run: exchange the real directory with the link,
+            #  so that outdir never disappears, then keep it as a generation.
+            exchange(link, self.outdir)
+            previous = self.outdir.with_name(f"{self.outdir.name}.{time.time_ns()}")
+            os.rename(link, previous)
+            previous = previous.resolve()
+        keep = (self.staging.resolve(), previous)
+        for d in self.generations():
+            if d.resolve() not in keep:
+                shutil.rmtree(d)
+
+    def close(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Also creates the parent of outdir, for ../index.rst.
+        (self.outdir.parent if self.atomic else self.outdir).mkdir(
+            parents=True, exist_ok=True
+        )
+        if self.atomic:
+            self._stage()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for fpath, key, changed, entry in executor.map(
+                self._flush, self.files.items()
+            ):
+                self.entries[key] = entry
+                if changed:
+                    self.changed.append(fpath)
+                    PROFILER.count("bytes_out", entry[1])
+
+        if self.incremental:
+            for key in sorted(set(self.manifest) - set(self.entries)):
+                fpath = self.outdir / key
+                if fpath.exists():
+                    if not self.atomic:
+                        fpath.unlink()
+                    self.removed.append(fpath)
+        if self.incremental or self.atomic:
+            outdir = self.staging if self.atomic else self.outdir
+            (outdir / self.MANIFEST).write_text(
+                json.dumps(self.entries, indent=1, sort_keys=True)
+            )
+        if self.atomic:
+            self._swap()
+            for tmp, fpath in self.deferred:
+                os.replace(tmp, fpath)
+        PROFILER.count("files_written", len(self.changed))
+        PROFILER.count("files_removed", len(self.removed))
+        log.info(
+            "Scritti %d file, rimossi %d, invariati %d",
+            len(self.changed),
+            len(self.removed),
+            len(self.entries) - len(self.changed),
+        )
+        return self.changed
+
+
+def exchange(src, dst):
+    """
+    Scambia i percorsi `src` e `dst` in modo atomico, con renameat2
+    (RENAME_EXCHANGE) dove disponibile; altrimenti sposta `dst` e rinomina
+    `src` al suo posto, lasciando `dst` assente per un istante.
+    """
+    import ctypes
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    renameat2 = getattr(libc, "renameat2", None)
+    if renameat2 is not None:
+        AT_FDCWD, RENAME_EXCHANGE = -100, 2
+        if not renameat2(
+            AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_EXCHANGE
+        ):
+            return
+        log.debug("renameat2: %s", os.strerror(ctypes.get_errno()))
+    tmp = Path(dst).with_name(f"{Path(dst).name}.exchange")
+    os.rename(dst, tmp)
+    os.rename(src, dst)
+    os.rename(tmp, src)
+
+
+def replace_text(fpath, text):
+    """Scrive il file in modo atomico, tramite un file temporaneo."""
+    tmp = fpath.with_name(f".{fpath.name}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, fpath)
+
+
+class CAD(object):
+    def __init__(self, text=None, source=None, schema="cad", plan=ACCENT_PLAN):
+        """
+        :param text: il documento XML, caricato interamente in memoria.
+        :param source: il percorso (o file) del documento XML, da leggere
+            in streaming con `iterparse_struttura`. I file compressi vengono
+            decompressi in streaming, vedi `open_snapshot`.
+        :param schema: i livelli delle partizioni, vedi `rules.get_schema`.
+        :param plan: le regole degli accenti, vedi `rules.compile_accent_rules`.
+        """
+        self.text = text
+        self.source = source
+        self.schema = get_schema(schema)
+        self.plan = plan
+        self.intestazione = Intestazione()
+        self.partizioni = []
+
+    def iter_struttura(self, render=None):
+        """
+        Percorre il documento una sola volta e restituisce, nell'ordine
+        del documento:
+
+        - ("intestazione", `Intestazione`);
+        - ("partizione", text) per ogni partizione dello schema, dove text
+          e' la sua intestazione (vedi `parse_capo`);
+        - ("articolo", valore di `render`) per ogni <articolo>, di
+          default `parse_articolo`;
+        - ("chiusura", annidata) alla fine di ogni partizione, vedi
+          `Struttura.chiudi`.
+        """
+        if render is None:
+            render = partial(parse_articolo, plan=self.plan)
+        if self.source is None:
+            from parsel import Selector
+
+            # Parsed as HTML, so the XPaths ignore the NIR namespaces.
+            # The tree lives only while parsing: the model keeps the rest.
+            cad = Selector(text=self.text, type="html")
+            # The partitions containing the current element: the others
+            #  are closed, as the end events of `iterparse_struttura`.
+            aperte = []
+            for e in cad.xpath(xpath_struttura(self.schema)):
+                tag = e.root.tag
+                if aperte:
+                    antenati = set(e.root.iterancestors())
+                    while aperte and aperte[-1] not in antenati:
+                        aperte.pop()
+                        yield "chiusura", bool(aperte)
+                if tag == "articolo":
+                    yield "articolo", render(e)
+                elif tag == "intestazione":
+                    yield "intestazione", parse_intestazione(e.root, self.plan)
+                else:
+                    aperte.append(e.root)
+                    yield "partizione", parse_capo(e, self.plan)[1]
+            while aperte:
+                aperte.pop()
+                yield "chiusura", bool(aperte)
+            return
+
+        source = self.source
+        if isinstance(source, (str, Path)) and is_compressed(source):
+            source = open_snapshot(source)
+        for event, value in iterparse_struttura(source, self.schema, self.plan):
+            if event == "articolo":
+                value = render(value)
+            yield event, value
+
+    def parse(self, workers=None, cache=None, index=None):
+        """
+        :param workers: se maggiore di 1, le righe degli articoli vengono
+            formattate da un pool di `workers` processi. I risultati
+            sono raccolti nell'ordine del documento, quindi l'output e'
+            identico a quello seriale.
+        :param cache: una `ParseCache` da cui recuperare gli articoli
+            gia' formattati.
+        :param index: un `search.IndexWriter` da aggiornare con ogni
+            articolo formattato.
+        """
+        self.struttura = Struttura(self.schema, index=index)
+        self.partizioni = self.struttura.partizioni
+        if not workers or workers <= 1:
+            executor = nullcontext()
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(max_workers=workers)
+
+        # The cache keys of the articles being formatted by the pool.
+        keys = {}
+        with executor:
+
+            def render(a):
+                PROFILER.count("articoli")
+                lines = articolo_lines(a)
+                if cache:
+                    key = cache.key(lines, self.plan)
+                    value = cache.get(key)
+                    if value is not None:
+                        PROFILER.count("cache_hits")
+                        return value
+                    PROFILER.count("cache_misses")
+                if not workers or workers <= 1:
+                    t0 = PROFILER.clock()
+                    value = format_articolo(lines, self.plan)
+                    PROFILER.article(t0, value)
+                else:
+                    value = executor.submit(timed_format_articolo, lines, self.plan)
+                if cache:
+                    if isinstance(value, Future):
+                        keys[value] = key
+                    else:
+                        cache.put(key, value)
+                return value
+
+            def add(event, value):
+                # Collect the results in this thread: the cache is not
+                #  thread-safe (e.g. ParseCache writes to sqlite).
+                if isinstance(value, Future):
+                    future = value
+                    value, seconds = future.result()
+                    PROFILER.add_article(seconds, value)
+                    if future in keys:
+                        cache.put(keys.pop(future), value)
+                self.add(event, value)
+
+            # Keep a bounded number of articles in flight, so that the
+            #  streaming parser still runs in constant memory.
+            window, pending = (workers or 1) * 32, deque()
+            for event in self.iter_struttura(render=render):
+                pending.append(event)
+                if len(pending) > window:
+                    add(*pending.popleft())
+            for event in pending:
+                add(*event)
+
+    def add(self, event, value):
+        """Aggiunge al modello un valore restituito da `iter_struttura`."""
+        if event == "articolo":
+            intro, text, offsets = value
+            self.struttura.aggiungi(Articolo.from_text(text, offsets), intro)
+        elif event == "partizione":
+            self.struttura.apri(value)
+        elif event == "chiusura":
+            self.struttura.chiudi(value)
+        else:
+            self.intestazione = value
+
+    def iter_articoli(self):
+        """
+        Restituisce (percorso, articolo) nell'ordine del documento, vedi
+        `Partizione.iter_articoli`.
+        """
+        for partizione in self.partizioni:
+            yield from partizione.iter_articoli()
+
+    def emit(self, emitters):
+        """
+        Scrive il documento con tutti gli `emitters` (vedi
+        `cad_normattiva.emitters`) in un solo passaggio sul modello.
+
+        :return: il risultato di `close` di ogni emettitore.
+        """
+        for emitter in emitters:
+            emitter.start(self)
+        for partizione in self.partizioni:
+            for emitter in emitters:
+                emitter.partizione(partizione)
+        return [emitter.close() for emitter in emitters]
+
+    def dump_index(self, outdir=BASEDIR, incremental=False, atomic=False, links=False):
+        """
+        Scrive l'indice, le partizioni e gli articoli in `outdir`.
+
+        :param incremental: riscrive solo i file cambiati e rimuove
+            quelli non piu' generati, vedi `OutputWriter`.
+        :param atomic: scrive in una directory di staging che sostituisce
+            `outdir` solo alla fine, vedi `OutputWriter`.
+        :param links: trasforma i riferimenti tra articoli in link, vedi
+            `references.Riferimenti`.
+        :return: la lista dei file scritti.
+        """
+        from .emitters import RstEmitter
+        from .references import Riferimenti
+
+        riferimenti = Riferimenti(self) if links else None
+        (changed,) = self.emit(
+            [RstEmitter(outdir, incremental, atomic, riferimenti=riferimenti)]
+        )
+        return changed
+
+
+def find_snapshots(pattern):
+    """
+    Restituisce i file delle versioni da formattare: `pattern` e' una
+    directory contenente i file cad-{dataVigenza}.xml oppure un glob.
+    """
+    if Path(pattern).is_dir():
+        return sorted(
+            Path(pattern).glob("*-[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9].xml")
+        )
+    return sorted(Path(x) for x in glob.glob(pattern))
+
+
+def snapshot_version(fpath):
+    version = RE_DATA_VIGENZA.findall(Path(fpath).name)
+    return version[-1] if version else Path(fpath).stem
+
+
+def parse_batch(
+    snapshots,
+    outdir,
+    workers=None,
+    cache=None,
+    stream=False,
+    incremental=False,
+    atomic=False,
+    index=None,
+    links=False,
+    schema="cad",
+    plan=ACCENT_PLAN,
+    formats=("rst",),
+):
+    """
+    Formatta piu' versioni della norma, scrivendo ognuna in
+    outdir/{dataVigenza}/_rst. Gli articoli invariati tra due versioni
+    vengono formattati una volta sola grazie alla cache condivisa.
+
+    :param index: un `search.SearchIndex`, aggiornato con ogni versione.
+    :param links: vedi `CAD.dump_index`.
+    :param schema: vedi `CAD`.
+    :param plan: vedi `CAD`.
+    :param formats: i formati di output, vedi `emitters.build_emitters`;
+        i formati diversi da rst sono scritti, di default, in
+        outdir/{dataVigenza}/{nome}.{FMT}.
+
+    :return: per ogni versione un dict con il tempo impiegato,
+        il numero di articoli e quanti sono stati riutilizzati.
+    """
+    from .emitters import build_emitters
+    from .references import Riferimenti
+
+    cache = cache or MemoryCache()
+    report = []
+    for fpath in snapshots:
+        version = snapshot_version(fpath)
+        hits, misses = cache.hits, cache.misses
+        t0 = time.perf_counter()
+
+        PROFILER.count("bytes_in", Path(fpath).stat().st_size)
+        with PROFILER.stage("parse"):
+            if stream:
+                cadparser = CAD(source=fpath, schema=schema, plan=plan)
+            else:
+                cadparser = CAD(text=read_snapshot(fpath), schema=schema, plan=plan)
+            writer = index.writer(fpath) if index else None
+            cadparser.parse(workers=workers, cache=cache, index=writer)
+            if writer:
+                writer.close()
+        dpath = Path(outdir) / version / "_rst"
+        dpath.mkdir(parents=True, exist_ok=True)
+        with PROFILER.stage("dump"):
+            riferimenti = Riferimenti(cadparser) if links else None
+            cadparser.emit(
+                build_emitters(formats, dpath, fpath, incremental, atomic, riferimenti)
+            )
+
+        reused = cache.hits - hits
+        articoli = reused + cache.misses - misses
+        report.append(
+            {
+                "version": version,
+                "source": str(fpath),
+                "seconds": round(time.perf_counter() - t0, 3),
+                "articoli": articoli,
+                "reused": reused,
+            }
+        )
+        log.info(
+            "Versione %s: %d articoli (%d riutilizzati) in %.2fs",
+            version,
+            articoli,
+            reused,
+            report[-1]["seconds"],
+        )
+    return report
+
+
+def parse_capo(e, plan=ACCENT_PLAN):
+    text = "".join(e.xpath("node()/text()").extract())
+    sezione = RE_NEWLINES.sub(" ", e.xpath("@id").get(""))
+    return sezione, format_capo(text, plan)
+
+
+def format_capo(text, plan=ACCENT_PLAN):
+    text = text.strip().strip(" -").strip("(")
+    text = RE_NEWLINES.sub(" ", text)
+    try:
+        capo, testo = RE_CAPO_TESTO.findall(text)[0]
+        text = f"{capo}. {testo}"
+    except (IndexError, ValueError):
+        pass
+
+    return fix_accent(text, plan)
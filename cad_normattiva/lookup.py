@@ -0,0 +1,223 @@
+"""
+Indice degli articoli di un documento XML: per ogni articolo l'offset e
+la lunghezza in byte di <articolo> nel file e le partizioni che lo
+contengono, secondo lo schema (vedi `rules.get_schema`).
+
+L'indice viene creato una volta per snapshot, accanto al file XML, e
+permette di formattare un solo articolo senza leggere tutto il documento:
+
+    cad-normattiva docs/_rst/cad.xml --articolo 64-bis
+    cad-normattiva --batch docs/_acts/cad --vigenza 2021-01-01 --articolo 64-bis
+    cad-normattiva codice.xml --schema codice --articolo 3
+"""
+import logging
+import mmap
+import re
+import sqlite3
+from collections import namedtuple
+from pathlib import Path
+
+from .formatter import (
+    Struttura,
+    find_snapshots,
+    mkfilename,
+    parse_articolo,
+    parse_capo,
+    snapshot_version,
+)
+from .model import Articolo
+from .rules import ACCENT_PLAN, RE_ARTICOLO_ID, get_schema
+from .store import is_compressed, open_snapshot
+
+log = logging.getLogger()
+
+Entry = namedtuple("Entry", "id offset length partizione")
+
+
+def re_tag(schema):
+    """I tag di apertura e chiusura delle partizioni e di <articolo>."""
+    tags = "|".join((*get_schema(schema), "articolo"))
+    return re.compile(rf"<(/?)(?:[\w.-]+:)?({tags})[\s/>]".encode())
+
+
+def iter_spans(data, schema="cad"):
+    """
+    Restituisce gli elementi di `data`, come `CAD.iter_struttura`:
+
+    - ("partizione", tag, start, end) per ogni partizione dello schema,
+      dove data[start:end] e' l'elemento fino al primo articolo o
+      sottopartizione, cioe' la sua intestazione;
+    - ("articolo", start, end) per ogni <articolo> in una partizione;
+    - ("chiusura", annidata) alla fine di ogni partizione.
+    """
+    # The open partitions, as [tag, start, heading not returned yet].
+    aperte, articolo_start = [], None
+    for m in re_tag(schema).finditer(data):
+        closing, tag = m.groups()
+        if not closing and aperte and aperte[-1][2]:
+            aperte[-1][2] = False
+            yield "partizione", aperte[-1][0], aperte[-1][1], m.start()
+        if tag == b"articolo":
+            if not closing and aperte:
+                articolo_start = m.start()
+            elif closing and articolo_start is not None:
+                end = data.find(b">", m.end() - 1) + 1
+                yield "articolo", articolo_start, end
+                articolo_start = None
+        elif not closing:
+            aperte.append([tag, m.start(), True])
+        elif aperte:
+            tag, start, intestazione = aperte.pop()
+            if intestazione:
+                end = data.find(b">", m.end() - 1) + 1
+                yield "partizione", tag, start, end
+            yield "chiusura", bool(aperte)
+
+
+def selector(data):
+    from parsel import Selector
+
+    return Selector(text=data.decode(), type="html")
+
+
+def articolo_id(data):
+    """L'id dell'articolo, come in `Articolo.id`, senza formattarlo."""
+    for l in selector(data).xpath("//articolo//corpo/p/text()").extract():
+        if l.strip(" ").startswith("Art"):
+            return RE_ARTICOLO_ID.findall(l)[0]
+
+
+class ArticoloIndex(object):
+    """
+    Indice sqlite degli articoli di `source`, salvato in `{source}.idx`.
+    Se il file XML (dimensione o mtime) o lo schema cambiano l'indice
+    viene ricreato.
+
+    :param schema: i livelli delle partizioni, vedi `rules.get_schema`.
+    """
+
+    def __init__(self, source, path=None, schema="cad"):
+        self.source = Path(source)
+        self.path = Path(path or f"{self.source}.idx")
+        self.schema = get_schema(schema)
+        self.db = sqlite3.connect(str(self.path))
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(articoli)")}
+        if columns and "partizione" not in columns:
+            # Written with the old capo / sezione columns: rebuilt.
+            self.db.executescript("DROP TABLE articoli; DROP TABLE meta;")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+                size INTEGER, mtime_ns INTEGER, schema TEXT
+            );
+            CREATE TABLE IF NOT EXISTS articoli (
+                id TEXT, offset INTEGER, length INTEGER, partizione TEXT
+            );
+            CREATE INDEX IF NOT EXISTS articoli_id ON articoli (id);
+            """
+        )
+        if self.is_stale():
+            self.build()
+
+    def is_stale(self):
+        st = self.source.stat()
+        row = self.db.execute("SELECT size, mtime_ns, schema FROM meta").fetchone()
+        return row != (st.st_size, st.st_mtime_ns, ",".join(self.schema))
+
+    def build(self):
+        """
+        Crea l'indice. I file non compressi sono mappati in memoria;
+        quelli compressi sono decompressi in memoria, senza file temporanei,
+        e gli offset si riferiscono al contenuto decompresso.
+        """
+        st = self.source.stat()
+        if is_compressed(self.source):
+            with open_snapshot(self.source) as f:
+                entries = list(self.scan(f.read()))
+        else:
+            with self.source.open("rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as data:
+                entries = list(self.scan(data))
+        with self.db:
+            self.db.execute("DELETE FROM articoli")
+            self.db.execute("DELETE FROM meta")
+            self.db.executemany("INSERT INTO articoli VALUES (?, ?, ?, ?)", entries)
+            self.db.execute(
+                "INSERT INTO meta VALUES (?, ?, ?)",
+                (st.st_size, st.st_mtime_ns, ",".join(self.schema)),
+            )
+        log.info("Indicizzati %d articoli di %s", len(entries), self.source)
+
+    def scan(self, data):
+        """
+        Restituisce le voci dell'indice. Le partizioni di ogni articolo si
+        ricavano dalle intestazioni e dalla chiusura degli elementi dello
+        schema con `Struttura`, come in `CAD.parse`; la partizione e'
+        salvata come il nome del suo file, es. "capo_I-sezione_II".
+        """
+        struttura = Struttura(self.schema)
+        for span in iter_spans(data, self.schema):
+            if span[0] == "partizione":
+                _, tag, start, end = span
+                tag = tag.decode()
+                header = data[start:end] + f"</{tag}>".encode()
+                _, text = parse_capo(selector(header).xpath(f"//{tag}")[0])
+                struttura.apri(text)
+            elif span[0] == "chiusura":
+                struttura.chiudi(span[1])
+            elif struttura.percorso:
+                _, start, end = span
+                id_ = articolo_id(data[start:end])
+                if id_ is not None:
+                    partizione = mkfilename(struttura.percorso)[: -len(".rst")]
+                    yield Entry(id_, start, end - start, partizione)
+
+    def get(self, articolo_id):
+        row = self.db.execute(
+            "SELECT * FROM articoli WHERE id = ? ORDER BY offset LIMIT 1",
+            (articolo_id,),
+        ).fetchone()
+        return Entry(*row) if row else None
+
+    def __iter__(self):
+        for row in self.db.execute("SELECT * FROM articoli ORDER BY offset"):
+            yield Entry(*row)
+
+    def read(self, entry):
+        with open_snapshot(self.source) as f:
+            f.seek(entry.offset)
+            return f.read(entry.length)
+
+    def render(self, articolo_id, plan=ACCENT_PLAN):
+        """
+        Formatta un solo articolo con `parse_articolo`.
+
+        :return: l'`Articolo` e la sua voce nell'indice.
+        :raise KeyError: se l'articolo non e' nell'indice.
+        """
+        entry = self.get(articolo_id)
+        if entry is None:
+            raise KeyError(articolo_id)
+        a = selector(self.read(entry)).xpath("//articolo")[0]
+        _, text, offsets = parse_articolo(a, plan)
+        return Articolo.from_text(text, offsets), entry
+
+    def close(self):
+        self.db.close()
+
+
+def find_vigenza(pattern, vigenza=None):
+    """
+    Lo snapshot in vigore alla data `vigenza`, cioe' l'ultimo con data
+    non successiva, tra quelli restituiti da `find_snapshots(pattern)`.
+    Senza data restituisce l'ultimo.
+    """
+    snapshots = [
+        s
+        for s in find_snapshots(pattern)
+        if vigenza is None or snapshot_version(s) <= vigenza
+    ]
+    if not snapshots:
+        raise FileNotFoundError(f"Nessuno snapshot in {pattern} per {vigenza}")
+    return max(snapshots, key=snapshot_version)
@@ -0,0 +1,197 @@
+"""
+Modello del documento formattato: partizioni, articoli e commi.
+
+Gli articoli conservano solo il testo RST di `format_articolo` e gli
+offset delle sue righe in un array di interi: i blocchi (numero, testo)
+usati dagli altri formati e dalle altre fasi sono costruiti dagli offset
+quando servono, cosi' nessuna fase deve rianalizzare il testo formattato.
+"""
+from array import array
+from dataclasses import dataclass, field
+
+from .rules import RE_ARTICOLO_ID, RE_PARAGRAFI
+
+
+@dataclass(slots=True)
+class Comma:
+    """Un comma: l'id (es. "2-bis") e i suoi blocchi nell'articolo, da start a end."""
+
+    id: str
+    start: int
+    end: int
+
+
+def testo_blocchi(blocchi):
+    """Il testo dei blocchi, una riga per blocco, es. "a) ai dati"."""
+    return "\n".join(f"{numero} {t}".strip() for numero, t in blocchi)
+
+
+@dataclass(slots=True)
+class Articolo:
+    """
+    Un articolo formattato: il testo RST di `format_articolo`, che inizia
+    con il titolo (es. "Art. 3-bis. Identita' digitale"), e per ogni riga
+    del corpo tre offset nel testo (inizio del numero, inizio e fine del
+    testo) in un array di interi. I blocchi (numero, testo) sono ricavati
+    dagli offset solo quando servono, vedi `blocchi`.
+    """
+
+    id: str
+    text: str
+    offsets: array = field(default_factory=lambda: array("I"))
+
+    @classmethod
+    def from_text(cls, text, offsets):
+        """Crea l'articolo dal testo e dagli offset di `format_articolo`."""
+        return cls(id=RE_ARTICOLO_ID.search(text).group(1), text=text, offsets=offsets)
+
+    @property
+    def titolo(self):
+        return self.text.partition("\n")[0]
+
+    @property
+    def blocchi(self):
+        """
+        Le righe del corpo come (numero, testo), dove numero e' es. "1."
+        o "a)" per commi e punti e "" per le altre righe.
+        """
+        text, o = self.text, self.offsets
+        return [
+            # Drop the RST escape and the space after the number, e.g. "1\\. ".
+            (text[o[i] : o[i + 1] - 1].replace("\\", ""), text[o[i + 1] : o[i + 2]])
+            for i in range(0, len(o), 3)
+        ]
+
+    @property
+    def commi(self):
+        blocchi = self.blocchi
+        starts = [
+            i
+            for i, (numero, _) in enumerate(blocchi)
+            if numero[:1].isdigit() and numero.endswith(".")
+        ]
+        ends = starts[1:] + [len(blocchi)]
+        return [
+            Comma(blocchi[start][0][:-1], start, end)
+            for start, end in zip(starts, ends)
+        ]
+
+    def comma_text(self, comma_id):
+        for c in self.commi:
+            if c.id == comma_id:
+                return testo_blocchi(self.blocchi[c.start : c.end])
+        raise KeyError(comma_id)
+
+    def paragrafi(self):
+        """
+        Il corpo dell'articolo per paragrafi, per i formati senza righe:
+        una lista di (numero, testo), dove numero e' es. "1." o "a)" per
+        commi e punti e "" per gli altri paragrafi. Le righe consecutive
+        senza numero formano un paragrafo; le righe vuote li separano.
+        """
+        gruppi = []
+        for numero, t in self.blocchi:
+            if numero or not gruppi or gruppi[-1][0]:
+                gruppi.append((numero, [t]))
+            else:
+                gruppi[-1][1].append(t)
+        ret = []
+        for numero, righe in gruppi:
+            for i, p in enumerate(RE_PARAGRAFI.split("\n".join(righe))):
+                if numero and not i:
+                    ret.append((numero, p.strip()))
+                elif p.strip():
+                    ret.append(("", p.strip()))
+        return ret
+
+    @property
+    def testo(self):
+        """Il corpo senza markup, un paragrafo per riga."""
+        return "\n".join(f"{numero} {t}".strip() for numero, t in self.paragrafi())
+
+
+@dataclass(slots=True)
+class Partizione:
+    """
+    Una partizione dell'atto: libro, parte, titolo, capo, sezione, ...
+    `figli` contiene le sottopartizioni e gli articoli nell'ordine del
+    documento, quindi la profondita' non e' limitata.
+    """
+
+    tipo: str
+    id: str
+    titolo: str
+    # The RST text preceding the first article, see `format_articolo`.
+    intro: str = ""
+    figli: list = field(default_factory=list)
+
+    @property
+    def nome(self):
+        """Es. "capo_IV", usato per i nomi dei file e le ancore."""
+        return f"{self.tipo}_{self.id}"
+
+    @property
+    def partizioni(self):
+        return [x for x in self.figli if isinstance(x, Partizione)]
+
+    @property
+    def articoli(self):
+        return [x for x in self.figli if isinstance(x, Articolo)]
+
+    def iter_articoli(self, percorso=()):
+        """
+        Restituisce (percorso, articolo) nell'ordine del documento, dove
+        percorso e' la tupla delle partizioni che contengono l'articolo.
+        """
+        percorso += (self,)
+        for x in self.figli:
+            if isinstance(x, Partizione):
+                yield from x.iter_articoli(percorso)
+            else:
+                yield percorso, x
+
+
+def posizione(percorso, schema):
+    """Gli id delle partizioni di `percorso` per ogni livello di `schema`."""
+    ret = dict.fromkeys(schema, "")
+    ret.update((p.tipo, p.id) for p in percorso)
+    return ret
+
+
+def chiave_articolo(articolo, chiavi):
+    """
+    La chiave dell'articolo tra le `chiavi` gia' usate nel documento, a
+    cui viene aggiunta: gli id ripetuti diventano "id#2", "id#3", ...
+    Il diff e l'indice di ricerca identificano gli articoli cosi'.
+    """
+    key, n = articolo.id, 2
+    while key in chiavi:
+        key, n = f"{articolo.id}#{n}", n + 1
+    chiavi.add(key)
+    return key
+
+
+# Words kept lowercase in the act type, e.g. "Decreto del Presidente ...".
+MINUSCOLE = {"del", "della", "dello", "dei", "delle", "di", "e"}
+
+
+@dataclass(slots=True)
+class Intestazione:
+    """I metadati dell'atto, da <intestazione>."""
+
+    tipo: str = ""
+    data: str = ""
+    numero: str = ""
+    titolo: str = ""
+
+    @property
+    def estremi(self):
+        """Es. "Decreto Legislativo 7 marzo 2005, n. 82"."""
+        tipo = " ".join(
+            w.lower() if w.lower() in MINUSCOLE else w.capitalize()
+            for w in self.tipo.split()
+        )
+        numero = f"n. {self.numero}" if self.numero else ""
+        return ", ".join(
+            x for x in (" ".join(x for x in (tipo, self.data) if x), numero) if x
+        )
@@ -0,0 +1,160 @@
+"""
+Strumentazione della pipeline download -> parse -> dump -> sphinx.
+
+Il profiler e' disabilitato di default; `python -m cad_normattiva --profile FILE`
+lo abilita e scrive il report JSON con i tempi per fase, i contatori
+(articoli, byte letti e scritti, cache) e gli articoli piu' lenti.
+
+Le fasi esterne (spider, sphinx-build) si misurano con
+
+    python -m cad_normattiva.profiler --report FILE --stage sphinx -- sphinx-build ...
+
+che esegue il comando e aggiunge il suo tempo allo stesso report.
+"""
+import argparse
+import heapq
+import json
+import logging
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+log = logging.getLogger()
+
+
+class Profiler(object):
+    """
+    Tempi per fase e per articolo, contatori e, opzionalmente,
+    cProfile e tracemalloc. Se non abilitato, ogni metodo e' un no-op.
+    """
+
+    SLOWEST = 20
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.counters = Counter()
+        self.slowest = []
+        self.articles = 0
+        self.articles_seconds = 0.0
+        self.cprofile = None
+        self.tracemalloc = False
+
+    def start(self, cprofile=False, tracemalloc=False):
+        self.enabled = True
+        if cprofile:
+            import cProfile
+
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        if tracemalloc:
+            import tracemalloc as _tracemalloc
+
+            self.tracemalloc = True
+            _tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def clock(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def article(self, t0, result):
+        """Registra il tempo di formattazione di un articolo iniziato a `t0`."""
+        if self.enabled:
+            self.add_article(time.perf_counter() - t0, result)
+
+    def add_article(self, seconds, result):
+        """Registra un articolo formattato in `seconds`, es. da un altro processo."""
+        if not self.enabled:
+            return
+        self.articles += 1
+        self.articles_seconds += seconds
+        item = (seconds, result[1].split("\n", 1)[0])
+        if len(self.slowest) < self.SLOWEST:
+            heapq.heappush(self.slowest, item)
+        else:
+            heapq.heappushpop(self.slowest, item)
+
+    def report(self):
+        report = {
+            "stages": {k: round(v, 6) for k, v in self.stages.items()},
+            "counters": dict(self.counters),
+            "articoli": {
+                "count": self.articles,
+                "seconds": round(self.articles_seconds, 6),
+                "slowest": [
+                    {"articolo": a, "seconds": round(s, 6)}
+                    for s, a in sorted(self.slowest, reverse=True)
+                ],
+            },
+        }
+        if self.tracemalloc:
+            import tracemalloc
+
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+            report["memory"] = {
+                "current": current,
+                "peak": peak,
+                "top": [str(x) for x in top],
+            }
+        return report
+
+    def dump(self, fpath, cprofile=None):
+        """
+        Aggiunge il report a `fpath`, preservando le fasi gia' registrate
+        da altri comandi della pipeline.
+        """
+        if self.cprofile and cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(cprofile)
+        merge_report(fpath, self.report())
+
+
+def merge_report(fpath, report):
+    fpath = Path(fpath)
+    old = json.loads(fpath.read_text()) if fpath.exists() else {}
+    old.setdefault("stages", {}).update(report.pop("stages", {}))
+    old.setdefault("counters", {}).update(report.pop("counters", {}))
+    old.update(report)
+    old["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    fpath.parent.mkdir(parents=True, exist_ok=True)
+    fpath.write_text(json.dumps(old, indent=1, sort_keys=True))
+
+
+PROFILER = Profiler()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Esegue un comando e ne registra il tempo nel report."
+    )
+    parser.add_argument("--report", required=True)
+    parser.add_argument("--stage", required=True)
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+
+    t0 = time.perf_counter()
+    ret = subprocess.call(command)
+    merge_report(
+        args.report,
+        {"stages": {args.stage: round(time.perf_counter() - t0, 6)}},
+    )
+    sys.exit(ret)
@@ -0,0 +1,129 @@
+"""
+Riferimenti tra articoli: "articolo 20, comma 1-bis", "art. 64 bis", e
+ad altri atti: "D.LGS. 26 AGOSTO 2016, N. 179".
+
+`Riferimenti` esamina il testo di tutti gli articoli di un `CAD` in un
+solo passaggio, con le espressioni di `rules` e un dizionario id ->
+pagina: i riferimenti interni diventano link RST (`RstEmitter`) e il
+grafo inverso ("chi cita l'art. 64") viene salvato in riferimenti.json:
+
+    cad-normattiva docs/_rst/cad.xml --links
+    cad-normattiva --cited-by 64
+"""
+import json
+from collections import namedtuple
+from pathlib import Path
+
+from .formatter import mkfilename
+from .rules import RE_ATTO, RE_ELENCO_ARTICOLI, RE_RIFERIMENTO
+
+RIFERIMENTI = "riferimenti.json"
+
+# start and end are offsets in the text of the block `blocco`.
+Riferimento = namedtuple("Riferimento", "blocco start end articolo comma")
+
+
+def pagina(percorso, articolo):
+    """Il nome del documento sphinx dell'articolo, es. capo_I-articolo_3."""
+    return mkfilename(percorso, articolo.id)[: -len(".rst")]
+
+
+def normalize_id(id_):
+    """Es. "64 bis" -> "64-bis", come in `Articolo.id`."""
+    return id_.replace(" ", "-").lower()
+
+
+def comma_at(commi, blocco):
+    """L'id del comma che contiene il blocco, o "" se precede il primo."""
+    ret = ""
+    for c in commi:
+        if c.start > blocco:
+            break
+        ret = c.id
+    return ret
+
+
+class Riferimenti(object):
+    """
+    I riferimenti di tutti gli articoli di `cad`:
+
+    - `links`: per ogni pagina, i `Riferimento` interni risolti;
+    - `citato_da`: per ogni articolo, chi lo cita (articolo, comma
+      in cui compare il riferimento e comma citato);
+    - `esterni`: per ogni atto citato, gli articoli che lo citano.
+    """
+
+    def __init__(self, cad):
+        articoli = list(cad.iter_articoli())
+        self.pagine = {}
+        for percorso, articolo in articoli:
+            self.pagine.setdefault(articolo.id, pagina(percorso, articolo))
+        self.links = {}
+        self.citato_da = {}
+        self.esterni = {}
+        for percorso, articolo in articoli:
+            self.scan(pagina(percorso, articolo), articolo)
+
+    def scan(self, doc, articolo):
+        """Esamina i blocchi dell'articolo: il titolo non e' un riferimento."""
+        links, commi = [], articolo.commi
+        for i, (_, text) in enumerate(articolo.blocchi):
+            for m in RE_RIFERIMENTO.finditer(text):
+                if m.group("atto"):
+                    continue
+                comma = normalize_id(m.group("comma") or "")
+                end = m.end("comma") if comma else m.end("id")
+                found = [(m.start(), end, m.group("id"), comma)]
+                if not comma and m.group("tipo").lower() in ("articoli", "artt."):
+                    # "articoli 3, 4 e 5": one reference for each id.
+                    e = RE_ELENCO_ARTICOLI.match(text, end)
+                    while e:
+                        found.append((e.start("id"), e.end("id"), e.group("id"), ""))
+                        e = RE_ELENCO_ARTICOLI.match(text, e.end())
+                for start, end, id_, comma in found:
+                    id_ = normalize_id(id_)
+                    if id_ == articolo.id or id_ not in self.pagine:
+                        continue
+                    links.append(Riferimento(i, start, end, id_, comma))
+                    self.citato_da.setdefault(id_, []).append(
+                        {
+                            "articolo": articolo.id,
+                            "comma": comma_at(commi, i),
+                            "comma_citato": comma,
+                        }
+                    )
+            for m in RE_ATTO.finditer(text):
+                atto = " ".join(m.group("tipo", "data")).lower()
+                atto = f"{atto}, n. {m.group('numero')}"
+                citanti = self.esterni.setdefault(atto, [])
+                if articolo.id not in citanti:
+                    citanti.append(articolo.id)
+        if links:
+            self.links[doc] = links
+
+    def link_rst(self, doc, blocco, text):
+        """Il testo di un blocco dell'articolo `doc` con i riferimenti come :doc: RST."""
+        ret, pos = [], 0
+        for r in self.links.get(doc, ()):
+            if r.blocco != blocco:
+                continue
+            ret += [
+                text[pos : r.start],
+                f":doc:`{text[r.start : r.end]} <{self.pagine[r.articolo]}>`",
+            ]
+            pos = r.end
+        ret.append(text[pos:])
+        return "".join(ret)
+
+    def to_json(self):
+        return json.dumps(
+            {"citato_da": self.citato_da, "esterni": self.esterni},
+            indent=1,
+            sort_keys=True,
+        )
+
+
+def cited_by(outdir, articolo_id):
+    """Chi cita l'articolo, secondo il grafo salvato in outdir/riferimenti.json."""
+    grafo = json.loads(Path(outdir, RIFERIMENTI).read_text())
+    return grafo["citato_da"].get(articolo_id, [])
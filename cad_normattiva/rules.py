@@ -0,0 +1,182 @@
+"""
+Espressioni regolari e tabelle di sostituzione usate dal formattatore,
+compilate una sola volta all'import.
+"""
+import hashlib
+import json
+import re
+from collections import namedtuple
+from itertools import groupby
+from pathlib import Path
+
+# Articoli.
+RE_DASHES = re.compile(r"^---+\s*$")
+RE_PARENS = re.compile(r"^\(\(|\)\)$")
+RE_COMMA = re.compile(r"^([0-9a-z\-]+)\)\s*")
+RE_PUNTO = re.compile(r"^([0-9a-z\-]+)\.\s*")
+RE_ARTICOLO_ID = re.compile(r"Art[^ ]* ([0-9a-zA-Z\-]+)")
+# Gli a capo diversi da "\n" riconosciuti da str.splitlines.
+RE_A_CAPO = re.compile("\r\n|[\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]")
+# I paragrafi di un testo, separati da righe vuote.
+RE_PARAGRAFI = re.compile(r"\n\s*\n")
+
+# Capi e sezioni.
+RE_NEWLINES = re.compile("[\r\n]")
+RE_CAPO_TESTO = re.compile(r"^(Capo [^ ]+) \(*([^)]+)\)*$", re.I)
+
+# Schemi delle partizioni, dalla piu' esterna. Ogni livello e' sia il tag
+# NIR (<libro>, <capo>, ...) sia la parola con cui inizia la sua
+# intestazione, es. "Titolo II", anche quando normattiva esporta tutte le
+# partizioni come <capo> consecutivi ("Capo I ... Sezione I ...").
+SCHEMI = {
+    "cad": ("capo", "sezione"),
+    "codice": ("libro", "parte", "titolo", "capo", "sezione"),
+}
+
+
+def get_schema(schema):
+    """
+    I livelli dello schema: `schema` e' il nome di uno schema in `SCHEMI`,
+    i livelli separati da virgole (es. "titolo,capo") o una sequenza.
+    """
+    if isinstance(schema, str):
+        return SCHEMI.get(schema) or tuple(schema.split(","))
+    return tuple(schema)
+
+
+def re_partizione(tipo):
+    """L'intestazione di una partizione, es. "Capo IV": il gruppo e' l'id."""
+    return re.compile(rf"\b{tipo.capitalize()} ([A-Z0-9]+)")
+
+
+# Riferimenti ad altri articoli, es. "articolo 20, comma 1-bis", "art. 64 bis".
+# Il gruppo "atto" e' presente se il riferimento e' a un altro atto
+# ("articolo 3 della legge ..."), ma non per "del presente codice". Prima
+# si consumano le lettere, i numeri e gli elenchi che seguono l'id
+# ("articoli 3 e 4", "articolo 2, comma 1, lettera a), del decreto ..."),
+# cosi' l'atto e' riconosciuto anche dopo di essi: nel dubbio, come
+# "dell'articolo 3 e dell'articolo 4 della legge ...", entrambi gli
+# articoli sono dell'altro atto.
+LATINI = (
+    "bis|ter|quater|quinquies|sexies|septies|octies|novies|nonies|decies"
+    "|undecies|duodecies|terdecies|quaterdecies|quinquiesdecies"
+)
+# The id ends at a word boundary: "3a" is not "3".
+ID_RIFERIMENTO = rf"[0-9]+(?:[- ](?:{LATINI}))?\b"
+# "lettera a)", "numero 3)", "commi 1", ...
+PARTE_RIFERIMENTO = (
+    r",?\s+(?:comm[ai]|letter[ae]|numer[oi]|punt[oi]|period[oi])"
+    rf"\s+(?:{ID_RIFERIMENTO}|[a-z]{{1,2}}\b)\)?"
+)
+# ", 4", " e 4", " e dell'articolo 4", " e b)", ...
+ELENCO_RIFERIMENTO = (
+    r"(?:,|\s+(?:e|ed|o))\s+"
+    r"(?:(?:(?:dell|all|nell|dall)'|(?:agli|degli|negli|dagli) )?"
+    r"(?:articol[oi]|artt?\.)\s+)?"
+    rf"(?:{ID_RIFERIMENTO}|[a-z]{{1,2}}\)|[0-9]+\))"
+)
+RE_RIFERIMENTO = re.compile(
+    rf"\b(?P<tipo>articol[oi]|artt?\.) +(?P<id>{ID_RIFERIMENTO})"
+    rf"(?:, *comm[ai] +(?P<comma>{ID_RIFERIMENTO}))?"
+    # A lookahead, so that "dell'articolo 4" later in the list is matched
+    #  on its own; the bare ids are found with RE_ELENCO_ARTICOLI.
+    rf"(?=(?:{PARTE_RIFERIMENTO}|{ELENCO_RIFERIMENTO})*"
+    r"(?P<atto>,?\s+(?:(?:del|della|dello|dei|delle)\s+(?!presente\b)\w"
+    r"|d\.\s?lgs|d\.l\.|d\.p\.r\.|decreto|legge))?)",
+    re.I,
+)
+# Gli altri id di un elenco di articoli, dopo il primo: "articoli 3, 4 e 5".
+RE_ELENCO_ARTICOLI = re.compile(
+    rf"(?:,|\s+(?:e|ed|o))\s+(?P<id>{ID_RIFERIMENTO})(?!\))", re.I
+)
+# Riferimenti ad atti, es. "D.LGS. 26 AGOSTO 2016, N. 179".
+RE_ATTO = re.compile(
+    r"\b(?P<tipo>d\.\s?lgs\.?|decreto legislativo|decreto-legge|d\.l\.|legge"
+    r"|d\.p\.r\.|decreto del presidente della repubblica)"
+    r"\s+(?P<data>[0-9]{1,2}\s+\w+\s+[0-9]{4}),?\s+n\.\s*(?P<numero>[0-9]+)",
+    re.I,
+)
+
+# Versioni: cad-{dataVigenza}.xml
+RE_DATA_VIGENZA = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+
+# Apostrofi da sostituire con l'accento: liberta' -> libertà.
+ACCENT_RULES = (
+    ("a'", "à"),
+    ("e'", "é"),
+    ("i'", "ì"),
+    ("A'", "À"),
+    ("o'", "ò"),
+    ("u'", "ù"),
+    ("E'", "È"),
+)
+
+# Correzioni applicate dopo ACCENT_RULES: po', Po', è, cioè.
+ACCENT_FIXES = (
+    ("pò", "po'"),
+    ("Pò", "Po'"),
+    ("e\\'", "è"),
+    (" é ", " è "),
+    ("cioé", "cioè"),
+)
+
+
+class AccentPlan(namedtuple("AccentPlan", "passes digest")):
+    """
+    Le sostituzioni degli accenti compilate da `compile_accent_rules`.
+
+    `passes` e' la lista di passate ((trigger, ((src, dst), ...)), ...):
+    ogni gruppo viene applicato con `str.replace` in cascata, solo se il
+    testo contiene il suo trigger; `digest` identifica le regole, es.
+    nella cache.
+    """
+
+    __slots__ = ()
+
+    def replace(self, l):
+        """Applica tutte le passate al testo."""
+        for t, group in self.passes:
+            if t in l:
+                for src, dst in group:
+                    l = l.replace(src, dst)
+        return l
+
+
+def compile_accent_rules(rules=ACCENT_RULES, fixes=ACCENT_FIXES):
+    """
+    Compila una tabella di sostituzioni in un `AccentPlan` da usare con
+    `fix_accent`.
+
+    Le sostituzioni consecutive che condividono lo stesso carattere
+    "trigger" (es. l'apostrofo) sono raggruppate: se il trigger non e'
+    presente nel testo, l'intero gruppo viene saltato con una sola scansione.
+    Le correzioni `fixes` valgono per il risultato di `rules`.
+
+    Altre norme possono estendere le regole, es:
+
+        plan = compile_accent_rules(ACCENT_RULES + (("U'", "Ù"),))
+        fix_accent(text, plan)
+    """
+
+    def trigger(src):
+        return next((c for c in src if not c.isascii() or c in "'\\"), src)
+
+    passes = tuple(
+        (t, tuple(group))
+        for t, group in groupby(
+            tuple(rules) + tuple(fixes), key=lambda x: trigger(x[0])
+        )
+    )
+    return AccentPlan(passes, hashlib.sha1(repr(passes).encode()).hexdigest())
+
+
+def read_accent_rules(fpath):
+    """
+    Le regole di un file JSON, es. [["U'", "Ù"]], aggiunte a
+    `ACCENT_RULES` e compilate con `compile_accent_rules`.
+    """
+    rules = tuple(tuple(x) for x in json.loads(Path(fpath).read_text()))
+    return compile_accent_rules(ACCENT_RULES + rules)
+
+
+ACCENT_PLAN = compile_accent_rules()
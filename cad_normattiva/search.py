@@ -0,0 +1,228 @@
+"""
+Indice full-text degli articoli di tutti gli atti, in sqlite FTS5.
+
+L'indice viene aggiornato da `CAD.parse`, man mano che gli articoli
+vengono formattati, e interrogato dalla CLI:
+
+    cad-normattiva docs/_acts/cad/cad.xml --index
+    cad-normattiva --search "firma digitale"
+
+Ogni comma e' un documento dell'indice, quindi i risultati riportano
+atto, articolo e comma. Il tokenizer unicode61 ignora gli accenti
+(liberta = libertà) e separa le elisioni (dell'atto -> dell, atto).
+
+L'aggiornamento e' incrementale: per ogni atto vengono reindicizzati
+solo gli articoli con sha1 diverso e rimossi quelli non piu' presenti.
+Le interrogazioni leggono il file mappato in memoria.
+"""
+import logging
+import re
+import sqlite3
+from collections import namedtuple
+from pathlib import Path
+
+from .diff import digest_articolo
+from .emitters import commi
+from .formatter import SEARCHDB, mkfilename, snapshot_version
+from .model import chiave_articolo
+
+log = logging.getLogger()
+
+RE_WORD = re.compile(r"\w+\*?")
+
+Risultato = namedtuple("Risultato", "atto versione articolo comma snippet")
+
+
+def atto_version(fpath):
+    """
+    Il nome dell'atto e la versione dal file: cad-2021-01-01.xml ->
+    ("cad", "2021-01-01"), cad.xml -> ("cad", "").
+    """
+    stem, version = Path(fpath).stem, snapshot_version(fpath)
+    if version == stem:
+        return stem, ""
+    return stem.removesuffix(f"-{version}"), version
+
+
+def match_query(query):
+    """
+    Le parole di `query` come query FTS5: tutte devono comparire nel
+    comma; "firm*" cerca le parole che iniziano per "firm".
+    """
+    return " ".join(
+        f'"{w[:-1]}"*' if w.endswith("*") else f'"{w}"' for w in RE_WORD.findall(query)
+    )
+
+
+def voci(articolo):
+    """
+    I documenti dell'indice per un articolo: (comma, testo), dove il
+    comma "" contiene il titolo e il testo che precede il primo comma.
+    """
+    ret = commi(articolo)
+    if ret and ret[0][0] == "":
+        return [("", f"{articolo.titolo}\n{ret[0][1]}")] + ret[1:]
+    return [("", articolo.titolo)] + ret
+
+
+class SearchIndex(object):
+    """
+    L'indice, salvato in `path`.
+
+    :param mmap_size: i byte del file letti tramite mmap.
+    """
+
+    def __init__(self, path=SEARCHDB, mmap_size=1 << 28):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(articoli)")}
+        has_voci = self.db.execute("PRAGMA table_info(voci)").fetchone()
+        if columns and ("partizione" not in columns or not has_voci):
+            # Written with the old capo / sezione columns, or with the
+            #  position of the comma packed in the rowid: the index only
+            #  holds derived data, so it is rebuilt.
+            self.db.executescript(
+                "DROP TABLE articoli; DROP TABLE IF EXISTS commi;"
+                " DROP TABLE IF EXISTS voci;"
+            )
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS articoli (
+                rowid INTEGER PRIMARY KEY, atto TEXT, id TEXT, versione TEXT,
+                partizione TEXT, digest TEXT, UNIQUE (atto, id)
+            );
+            CREATE TABLE IF NOT EXISTS voci (
+                rowid INTEGER PRIMARY KEY, articolo INTEGER, posizione INTEGER,
+                UNIQUE (articolo, posizione)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS commi USING fts5(
+                text, comma UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+            """
+        )
+
+    def writer(self, fpath):
+        """
+        L'`IndexWriter` per aggiornare l'atto con lo snapshot `fpath`, da
+        passare a `CAD.parse`. Vedi `atto_version`.
+        """
+        return IndexWriter(self, *atto_version(fpath))
+
+    def search(self, query, atto=None, limit=20):
+        """
+        I commi che contengono tutte le parole di `query`, ordinati per
+        rilevanza (bm25).
+
+        :return: una lista di `Risultato`.
+        """
+        match = match_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT a.atto, a.versione, a.id, c.comma,"
+            " snippet(commi, 0, '[', ']', '...', 12)"
+            " FROM commi AS c JOIN voci AS v ON v.rowid = c.rowid"
+            " JOIN articoli AS a ON a.rowid = v.articolo"
+            " WHERE commi MATCH ?"
+        )
+        args = [match]
+        if atto:
+            sql += " AND a.atto = ?"
+            args.append(atto)
+        sql += " ORDER BY rank LIMIT ?"
+        args.append(limit)
+        return [Risultato(*row) for row in self.db.execute(sql, args)]
+
+    def close(self):
+        self.db.close()
+
+
+class IndexWriter(object):
+    """
+    Aggiorna nell'indice gli articoli di un atto: `add` viene chiamato da
+    `CAD.parse` per ogni articolo, `close` rimuove gli articoli non piu'
+    presenti e salva le modifiche.
+
+    Gli id ripetuti diventano "id#2", "id#3", ... come in
+    `diff.snapshot_articoli`.
+    """
+
+    def __init__(self, index, atto, versione=""):
+        self.db = index.db
+        self.atto = atto
+        self.versione = versione
+        self.old = {
+            id_: (rowid, digest_)
+            for rowid, id_, digest_ in self.db.execute(
+                "SELECT rowid, id, digest FROM articoli WHERE atto = ?", (atto,)
+            )
+        }
+        self.seen = set()
+        self.stats = {"added": 0, "updated": 0, "removed": 0}
+
+    def delete(self, rowid):
+        """Rimuove dall'indice i commi dell'articolo `rowid`."""
+        self.db.execute(
+            "DELETE FROM commi WHERE rowid IN"
+            " (SELECT rowid FROM voci WHERE articolo = ?)",
+            (rowid,),
+        )
+        self.db.execute("DELETE FROM voci WHERE articolo = ?", (rowid,))
+
+    def add(self, percorso, articolo):
+        """
+        :param percorso: le partizioni che contengono l'articolo, salvate
+            come il nome del loro file, es. "capo_I-sezione_II".
+        """
+        key = chiave_articolo(articolo, self.seen)
+
+        digest_ = digest_articolo(articolo)
+        location = (self.versione, mkfilename(percorso)[: -len(".rst")])
+        rowid, old_digest = self.old.get(key, (None, None))
+        if old_digest == digest_:
+            self.db.execute(
+                "UPDATE articoli SET versione = ?, partizione = ? WHERE rowid = ?",
+                (*location, rowid),
+            )
+            return
+        if rowid is None:
+            rowid = self.db.execute(
+                "INSERT INTO articoli (atto, id, versione, partizione, digest)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.atto, key, *location, digest_),
+            ).lastrowid
+            self.stats["added"] += 1
+        else:
+            self.delete(rowid)
+            self.db.execute(
+                "UPDATE articoli SET versione = ?, partizione = ?, digest = ?"
+                " WHERE rowid = ?",
+                (*location, digest_, rowid),
+            )
+            self.stats["updated"] += 1
+        for i, (comma, text) in enumerate(voci(articolo)):
+            voce = self.db.execute(
+                "INSERT INTO voci (articolo, posizione) VALUES (?, ?)", (rowid, i)
+            ).lastrowid
+            self.db.execute(
+                "INSERT INTO commi (rowid, text, comma) VALUES (?, ?, ?)",
+                (voce, text, comma),
+            )
+
+    def close(self):
+        """:return: il numero di articoli aggiunti, aggiornati e rimossi."""
+        for key in set(self.old) - self.seen:
+            rowid, _ = self.old[key]
+            self.delete(rowid)
+            self.db.execute("DELETE FROM articoli WHERE rowid = ?", (rowid,))
+            self.stats["removed"] += 1
+        if self.stats["added"] or self.stats["updated"] or self.stats["removed"]:
+            # Merge some FTS segments, so that the index stays compact
+            #  without rewriting it all on every update.
+            self.db.execute("INSERT INTO commi (commi, rank) VALUES ('merge', 64)")
+        self.db.commit()
+        log.info("Indice di %s %s: %r", self.atto, self.versione, self.stats)
+        return self.stats
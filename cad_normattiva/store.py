@@ -0,0 +1,114 @@
+"""
+Archivio compresso degli export XML, indirizzato per contenuto.
+
+Ogni export viene salvato una sola volta in
+
+    {root}/objects/{sha1[:2]}/{sha1}.xml.zst   (o .xml.gz senza zstandard)
+
+dove sha1 e' quello del contenuto non compresso; {nome}.xml e
+{nome}-{dataVigenza}.xml diventano link simbolici all'oggetto.
+
+`open_snapshot` apre allo stesso modo file compressi e non compressi,
+decomprimendo in streaming senza copie temporanee.
+"""
+import gzip
+import hashlib
+import os
+from pathlib import Path
+
+STOREDIR = "docs/_cache/snapshots"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def open_snapshot(fpath):
+    """
+    Apre in lettura binaria un export XML, compresso con gzip o zstd
+    oppure no. Se `fpath` e' gia' un file lo restituisce invariato.
+    """
+    if hasattr(fpath, "read"):
+        return fpath
+    with open(fpath, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(fpath, "rb")
+    if magic.startswith(ZSTD_MAGIC):
+        zstd = zstandard()
+        if zstd is None:
+            raise RuntimeError(f"{fpath} e' compresso con zstd: installare zstandard")
+        return zstd.ZstdDecompressor().stream_reader(open(fpath, "rb"), closefd=True)
+    return open(fpath, "rb")
+
+
+def is_compressed(fpath):
+    with open(fpath, "rb") as f:
+        magic = f.read(4)
+    return magic.startswith(GZIP_MAGIC) or magic.startswith(ZSTD_MAGIC)
+
+
+def read_snapshot(fpath):
+    """Il testo di un export XML, compresso o no."""
+    with open_snapshot(fpath) as f:
+        return f.read().decode()
+
+
+class SnapshotStore(object):
+    """
+    :param root: la directory dell'archivio.
+    :param codec: "zstd", "gzip" o None per scegliere zstd se disponibile.
+    """
+
+    SUFFIXES = {"zstd": ".xml.zst", "gzip": ".xml.gz"}
+
+    def __init__(self, root=STOREDIR, codec=None):
+        self.root = Path(root)
+        self.codec = codec or ("zstd" if zstandard() else "gzip")
+
+    def object_path(self, digest, codec=None):
+        suffix = self.SUFFIXES[codec or self.codec]
+        return self.root / "objects" / digest[:2] / f"{digest}{suffix}"
+
+    def find(self, digest):
+        """L'oggetto con questo sha1, in qualunque formato, o None."""
+        for codec in self.SUFFIXES:
+            fpath = self.object_path(digest, codec)
+            if fpath.exists():
+                return fpath
+
+    def compress(self, body):
+        if self.codec == "zstd":
+            return zstandard().ZstdCompressor(level=10).compress(body)
+        return gzip.compress(body, compresslevel=9, mtime=0)
+
+    def put(self, body):
+        """
+        Salva `body` se non e' gia' nell'archivio.
+
+        :return: lo sha1 di `body` e il percorso dell'oggetto.
+        """
+        digest = hashlib.sha1(body).hexdigest()
+        fpath = self.find(digest)
+        if fpath is None:
+            fpath = self.object_path(digest)
+            fpath.parent.mkdir(parents=True, exist_ok=True)
+            tmp = fpath.with_name(f".{fpath.name}.{os.getpid()}")
+            tmp.write_bytes(self.compress(body))
+            os.replace(tmp, fpath)
+        return digest, fpath
+
+    def link(self, pointer, fpath):
+        """Punta `pointer` all'oggetto `fpath` con un link simbolico relativo."""
+        pointer = Path(pointer)
+        pointer.parent.mkdir(parents=True, exist_ok=True)
+        tmp = pointer.with_name(f".{pointer.name}.{os.getpid()}")
+        tmp.unlink(missing_ok=True)
+        tmp.symlink_to(os.path.relpath(fpath, pointer.parent))
+        os.replace(tmp, pointer)
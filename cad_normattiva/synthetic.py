@@ -0,0 +1,159 @@
+"""
+Generatore di documenti sintetici con la struttura dell'export XML di
+normattiva, per i benchmark e per i test che non dispongono di cad.xml.
+
+    python -m cad_normattiva.synthetic --scale 10 > cad-x10.xml
+
+La scala 1 ha all'incirca le dimensioni del CAD.
+"""
+import argparse
+import random
+
+ROMAN = (
+    (1000, "M"),
+    (900, "CM"),
+    (500, "D"),
+    (400, "CD"),
+    (100, "C"),
+    (90, "XC"),
+    (50, "L"),
+    (40, "XL"),
+    (10, "X"),
+    (9, "IX"),
+    (5, "V"),
+    (4, "IV"),
+    (1, "I"),
+)
+
+WORDS = (
+    "la pubblica amministrazione assicura disponibilita' gestione accesso "
+    "trasmissione conservazione e' fruibilita' dell'informazione in modalita' "
+    "digitale documento informatico firma elettronica un po' cioe' identita' "
+    "servizi dati dei cittadini e delle imprese ai sensi dell'articolo comma "
+    "del presente codice E' consentito l'uso delle tecnologie"
+).split()
+
+NIR = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<NIR xmlns="http://www.normeinrete.it/nir/2.2/"'
+    ' xmlns:h="http://www.w3.org/HTML/1998/html4"'
+    ' xmlns:xlink="http://www.w3.org/1999/xlink" tipo="originale">\n'
+    "<DecretoLegislativo>\n"
+    "<intestazione><tipoDoc>DECRETO LEGISLATIVO</tipoDoc>"
+    '<dataDoc norm="20050307">7 marzo 2005</dataDoc>, n. <numDoc>82</numDoc>'
+    "<titoloDoc>Codice sintetico.</titoloDoc></intestazione>\n"
+    "<articolato>\n"
+)
+
+
+def roman(n):
+    """Numero romano per l'indice `n` (a partire da 0)."""
+    n += 1
+    ret = ""
+    for value, digits in ROMAN:
+        while n >= value:
+            ret += digits
+            n -= value
+    return ret
+
+
+def sentence(r, n=12):
+    return " ".join(r.choice(WORDS) for _ in range(n))
+
+
+def punti(r, n, depth, level=0):
+    """Punti di una lista, annidati su `depth` livelli: a), 1), a. ..."""
+    if level >= depth:
+        return []
+    ret = []
+    for i in range(n):
+        marker = (
+            f"{chr(97 + i % 26)})",
+            f"{i + 1})",
+            f"{chr(97 + i % 26)}.",
+        )[level % 3]
+        ret.append(f"<p>{marker} (({sentence(r, 8)})); </p>")
+        ret += punti(r, max(n // 2, 1), depth, level + 1)
+    return ret
+
+
+def synthetic_cad(
+    capi=9, sezioni=2, articoli=9, commi=4, punti_per_lista=4, depth=1, seed=0
+):
+    """
+    Restituisce un documento con `capi` capi, ognuno con `sezioni` sezioni
+    (0 per i capi senza sezioni) di `articoli` articoli. Ogni articolo ha
+    `commi` commi, con liste di `punti_per_lista` punti annidate su `depth`
+    livelli.
+    """
+    r = random.Random(seed)
+    out = [NIR]
+    n = 0
+    for c in range(capi):
+        for s in range(max(sezioni, 1)):
+            capo = f"<num>Capo {roman(c)} </num>"
+            if not sezioni:
+                rubrica = f"<rubrica>(DISPOSIZIONI DEL CAPO {c + 1})</rubrica>"
+            elif s == 0:
+                rubrica = (
+                    f"<rubrica>- DISPOSIZIONI DEL CAPO {c + 1} "
+                    f"Sezione {roman(s)} Finalita' della sezione {s + 1}</rubrica>"
+                )
+            else:
+                capo = f"<num>Sezione {roman(s)} </num>"
+                rubrica = f"<rubrica>Finalita' della sezione {s + 1}</rubrica>"
+            capo_id = f"{c + 1}" if s == 0 else f"{c + 1}-{s + 1}"
+            out.append(f'<capo id="{capo_id}">{capo}{rubrica}\n')
+
+            for a in range(articoli):
+                n += 1
+                label = f"{n}" + ("-bis" if r.random() < 0.1 else "")
+                ps = [f"<p>Art. {label} </p>", f"<p>({sentence(r, 5)}) </p>"]
+                if a == 0 and s == 0:
+                    ps.insert(0, f"<p>Capo {roman(c)} </p>")
+                for k in range(commi):
+                    ps.append(f"<p>{k + 1}. {sentence(r, 25)} </p>")
+                    if r.random() < 0.4:
+                        ps += punti(r, punti_per_lista, depth)
+                        ps.append(f"<p>{sentence(r, 10)} </p>")
+                    if r.random() < 0.1:
+                        ps.append("<p>---------- </p>")
+                body = "\n".join(ps)
+                out.append(
+                    f'<articolo id="{label}"><num>Art. {label}.</num>'
+                    f'<comma id="art{label}-com1"><num>1</num>'
+                    f"<corpo>\n{body}\n</corpo></comma></articolo>\n"
+                )
+            out.append("</capo>\n")
+    out.append("</articolato>\n</DecretoLegislativo>\n</NIR>\n")
+    return "".join(out)
+
+
+def synthetic_scale(scale=1, **kwargs):
+    """Un documento `scale` volte piu' grande del CAD."""
+    kwargs.setdefault("capi", 9 * scale)
+    return synthetic_cad(**kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--sezioni", type=int, default=2)
+    parser.add_argument("--articoli", type=int, default=9)
+    parser.add_argument("--commi", type=int, default=4)
+    parser.add_argument("--punti", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(
+        synthetic_scale(
+            args.scale,
+            sezioni=args.sezioni,
+            articoli=args.articoli,
+            commi=args.commi,
+            punti_per_lista=args.punti,
+            depth=args.depth,
+            seed=args.seed,
+        ),
+        end="",
+    )
@@ -106,6 +106,8 @@ exclude_patterns = [
     ".venv*",
     ".tox",
     "*.md",
+    # Staging and previous trees of `python -m cad_normattiva --atomic`.
+    "_rst.*",
 ]
 
 # The name of the Pygments (syntax highlighting) style to use.
@@ -1,75 +1,144 @@
 import logging
-import re
+import sys
 from pathlib import Path
-
-import yaml
+from urllib.parse import urlparse
 
 import scrapy
 from scrapy import FormRequest
 from scrapy.http import Request
 
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cad_normattiva.acts import (  # noqa: E402
+    BASEURL,
+    STATE,
+    FetchState,
+    export_url,
+    make_acts,
+    parse_atto,
+    replay_act,
+    save_act,
+)
+from cad_normattiva.store import SnapshotStore  # noqa: E402
+
 logging.basicConfig(level=logging.DEBUG)
 
 
 class BasicSpider(scrapy.Spider):
+    """
+    Scarica l'export XML di uno o piu' atti da normattiva.
+
+    Senza argomenti scarica il CAD in docs/_rst/cad.xml; con
+
+        scrapy runspider scrapy/normattiva.py -a urns=atti.txt
+
+    scarica tutti gli atti elencati in atti.txt (vedi `read_urns`),
+    ognuno in docs/_acts/{nome}/{nome}.xml, con una sessione separata.
+
+    Se la dataVigenza non e' cambiata dall'ultimo download (vedi
+    `FetchState`) l'export non viene richiesto, a meno di -a force=1.
+    Con -a offline=1 non accede alla rete e ripristina gli export salvati;
+    con -a baseurl=http://localhost:8000/ usa un server alternativo;
+    con -a store=docs/_cache/snapshots salva gli export compressi, una
+    volta sola, in uno `SnapshotStore`.
+    """
+
     name = "basic"
     allowed_domains = ["www.normattiva.it"]
-    start_urls = [
-        "https://www.normattiva.it/uri-res/N2Ls?"
-        # "urn:nir:stato:decreto.legislativo:2020;76!vig=2050"
-        "urn:nir:stato:decreto.legislativo:2005-03-07;82!vig=2021"
-    ]
-
-    def parse(self, response):
-        cookie = response.headers["Set-Cookie"]
-        self.codiceRedazionale = response.selector.xpath(
-            '//input[@name="atto.codiceRedazionale"]'
-        ).attrib["value"]
-        self.dataPubblicazioneGazzetta = response.selector.xpath(
-            '//input[@name="atto.dataPubblicazioneGazzetta"]'
-        ).attrib["value"]
-        self.dataVigenza = re.findall(
-            "atto.dataVigenza=(\d+-\d+-\d+)", response.body.decode()
-        )[0]
-        self.titolo = (
-            response.selector.xpath('//meta[@property="eli:title"]/@content')
-            .get()
-            .strip()
-        )
+    custom_settings = {
+        "CONCURRENT_REQUESTS": 16,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 4,
+        "AUTOTHROTTLE_ENABLED": True,
+        "AUTOTHROTTLE_START_DELAY": 1.0,
+        "AUTOTHROTTLE_MAX_DELAY": 30.0,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": 2.0,
+        "RETRY_TIMES": 3,
+    }
+
+    def __init__(
+        self,
+        urns=None,
+        outdir="docs/_acts",
+        state=STATE,
+        force=False,
+        offline=False,
+        baseurl=None,
+        store=None,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.state = FetchState(state)
+        # Spider arguments are strings, e.g. -a force=1
+        self.force = str(force).lower() in ("1", "true", "yes")
+        self.offline = str(offline).lower() in ("1", "true", "yes")
+        self.baseurl = BASEURL
+        if baseurl:
+            self.baseurl = baseurl.rstrip("/") + "/uri-res/N2Ls?"
+            self.allowed_domains = [urlparse(baseurl).hostname]
+        self.acts = make_acts(urns, outdir)
+        self.store = SnapshotStore(store) if store else None
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        if self.offline:
+            for act in self.acts:
+                self.replay(act)
+            return
+
+        for i, act in enumerate(self.acts):
+            yield Request(
+                url=self.baseurl + act["urn"],
+                meta={"cookiejar": i},
+                cb_kwargs={"act": act},
+                callback=self.parse,
+            )
+
+    def parse(self, response, act):
+        act.update(parse_atto(response.selector, response.body.decode()))
         self.logger.info(
-            f"Trovate le seguenti informazioni: {self.codiceRedazionale}, "
-            f"{self.dataPubblicazioneGazzetta}, {self.dataVigenza}"
+            f"Trovate le seguenti informazioni per {act['name']}: "
+            f"{act['codiceRedazionale']}, "
+            f"{act['dataPubblicazioneGazzetta']}, {act['dataVigenza']}"
         )
-        url_1 = (
-            f"https://www.normattiva.it/atto/vediMenuExport?"
-            f"atto.dataPubblicazioneGazzetta={self.dataPubblicazioneGazzetta}&"
-            f"atto.codiceRedazionale={self.codiceRedazionale}&currentSearch="
+        if not self.force and self.state.is_unchanged(act["urn"], act):
+            self.logger.info("%s e' invariato, salto l'export", act["name"])
+            return
+
+        url_1 = response.urljoin(export_url(act))
+        yield Request(
+            url=url_1,
+            meta={"cookiejar": response.meta["cookiejar"]},
+            cb_kwargs={"act": act},
+            # The same act may be listed with different vigenza dates.
+            dont_filter=True,
+            callback=self.parse_export,
         )
-        yield Request(url=url_1, headers={"Cookie": cookie}, callback=self.parse_export)
 
-    def parse_export(self, response):
+    def parse_export(self, response, act):
         self.logger.info("Sending form from %s", response.url)
         return FormRequest.from_response(
             response,
             formid="anteprima",
             clickdata={"name": "generaXml"},
+            meta={"cookiejar": response.meta["cookiejar"]},
+            cb_kwargs={"act": act},
+            dont_filter=True,
             callback=self.save_response,
         )
 
-    def save_response(self, response):
+    def save_response(self, response, act):
         self.logger.info(
             "Visited %s: %s", response.url, response.headers.get("Content-Type")
         )
-        dpath = Path("docs/_rst")
-        dpath.mkdir(exist_ok=True)
-        Path(dpath / "cad.xml").write_bytes(response.body)
-        Path(dpath / f"cad-{self.dataVigenza}.xml").write_bytes(response.body)
-        document_settings_yaml = Path(f"docs/document_settings.yml")
-        document_settings = yaml.safe_load(document_settings_yaml.read_text())
-        document_settings["document"].update(
-            {
-                "name": self.titolo,
-                "version": f"v{self.dataVigenza}",
-            }
-        )
-        document_settings_yaml.write_text(yaml.safe_dump(document_settings))
+        self.save(act, response.body)
+
+    def replay(self, act):
+        """Ripristina l'ultimo export salvato, senza accedere alla rete."""
+        replay_act(act, self.state, store=self.store)
+
+    def save(self, act, body):
+        save_act(act, body, self.state, store=self.store)
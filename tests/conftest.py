@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+
+# Un atto con lo schema "codice": libri, titoli, capi e sezioni.
+CODICE = """<?xml version="1.0" encoding="UTF-8"?>
+<NIR xmlns="http://www.normeinrete.it/nir/2.2/" xmlns:h="http://www.w3.org/HTML/1998/html4">
+<DecretoLegislativo>
+<intestazione><tipoDoc>DECRETO LEGISLATIVO</tipoDoc>
+<dataDoc norm="20230331">31 marzo 2023</dataDoc>, n. <numDoc>36</numDoc>
+<titoloDoc>Codice dei contratti pubblici.</titoloDoc></intestazione>
+<articolato>
+<libro id="1"><num>Libro I </num><rubrica>DEI PRINCIPI</rubrica>
+<titolo id="1-1"><num>Titolo I </num><rubrica>I principi generali</rubrica>
+<articolo id="1"><num>Art. 1.</num><comma id="art1-com1"><num>1</num><corpo>
+<p>Art. 1 </p><p>(Principio del risultato) </p><p>1. Testo. </p>
+</corpo></comma></articolo>
+<capo id="1-1-1"><num>Capo I </num><rubrica>(AMBITO)</rubrica>
+<sezione id="1-1-1-1"><num>Sezione I </num><rubrica>Definizioni</rubrica>
+<articolo id="2"><num>Art. 2.</num><comma id="art2-com1"><num>1</num><corpo>
+<p>Art. 2 </p><p>(Definizioni) </p><p>1. Testo. </p>
+</corpo></comma></articolo>
+</sezione></capo>
+<articolo id="9"><num>Art. 9.</num><comma id="art9-com1"><num>1</num><corpo>
+<p>Art. 9 </p><p>(Dopo il capo) </p><p>1. Testo. </p>
+</corpo></comma></articolo>
+</titolo></libro>
+<capo id="2"><num>Libro II </num><rubrica>- DELL'APPALTO Titolo I Capo I Le procedure</rubrica>
+<articolo id="3"><num>Art. 3.</num><comma id="art3-com1"><num>1</num><corpo>
+<p>Art. 3 </p><p>(Procedure) </p><p>1. Testo. </p>
+</corpo></comma></articolo>
+</capo>
+</articolato>
+</DecretoLegislativo>
+</NIR>
+"""
+
+
+@pytest.fixture
+def cad_xml(tmp_path):
+    """cad.xml se presente, altrimenti un documento sintetico."""
+    fpath = Path("cad.xml")
+    if not fpath.exists():
+        from cad_normattiva.synthetic import synthetic_cad
+
+        fpath = tmp_path / "cad.xml"
+        fpath.write_text(synthetic_cad())
+    return fpath
+
+
+@pytest.fixture
+def cad(cad_xml):
+    return cad_xml.read_text()
+
+
+@pytest.fixture
+def codice():
+    return CODICE
+
+
+@pytest.fixture
+def codice_xml(codice, tmp_path):
+    fpath = tmp_path / "codice.xml"
+    fpath.write_text(codice)
+    return fpath
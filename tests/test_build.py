@@ -0,0 +1,37 @@
+from cad_normattiva.build import build
+
+
+def test_build_changed_files(cad_xml, tmp_path):
+    srcdir, builddir = tmp_path / "docs", tmp_path / "_build"
+    outdir = srcdir / "_rst"
+    outdir.mkdir(parents=True)
+    commands = []
+
+    def run(command, check):
+        commands.append(command)
+        if command[0] == "sphinx-build":
+            doctrees = builddir / ".doctrees"
+            doctrees.mkdir(parents=True, exist_ok=True)
+            (doctrees / "environment.pickle").write_bytes(b"")
+
+    kw = dict(outdir=str(outdir), srcdir=str(srcdir), builddir=str(builddir), run=run)
+    files = build(cad_xml, **kw)
+    doc8, sphinx = commands
+    assert doc8[-len(files) :] == files
+    assert str(srcdir / "index.rst") in files
+    # First build: no environment yet, so sphinx builds everything.
+    assert sphinx[-2:] == [str(srcdir), str(builddir)]
+    assert sphinx[sphinx.index("-j") + 1] == "auto"
+
+    # Nothing changed: neither doc8 nor sphinx run.
+    commands.clear()
+    assert build(cad_xml, **kw) == []
+    assert commands == []
+
+    # One article changed: only its page is linted and rebuilt.
+    head, sep, tail = cad_xml.read_text().rpartition("<p>1. ")
+    changed = tmp_path / "cad.xml"
+    changed.write_text(f"{head}{sep}zanzibar {tail}")
+    files = build(changed, **kw)
+    assert len(files) == 1 and "articolo" in files[0]
+    assert [c[-1] for c in commands] == files * 2
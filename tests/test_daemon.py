@@ -0,0 +1,149 @@
+import json
+import os
+import shutil
+import threading
+import time
+from urllib.request import urlopen
+
+import pytest
+
+from cad_normattiva.daemon import (
+    IN_CLOSE_WRITE,
+    IN_EVENT,
+    IN_IGNORED,
+    IN_Q_OVERFLOW,
+    Daemon,
+    InotifyWatcher,
+    inotify,
+    serve_status,
+)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.05)
+
+
+@pytest.mark.parametrize("polling", [False, True])
+def test_daemon_rerenders_changed_articles(cad_xml, tmp_path, polling):
+    source = tmp_path / "_rst" / "cad.xml"
+    source.parent.mkdir()
+    text = cad_xml.read_text()
+    source.write_text(text)
+
+    daemon = Daemon([source], debounce=0.2, interval=0.05, polling=polling)
+    server = serve_status(daemon, 0)
+    thread = threading.Thread(target=daemon.run)
+    thread.start()
+    try:
+        wait_for(lambda: daemon.counters["renders"] == 1)
+        articoli = daemon.status()["acts"][str(source)]["articoli"]
+
+        # A burst of writes is rendered once.
+        head, sep, tail = text.rpartition("<p>1. ")
+        for word in ("zanzibar", "zanzibar zanzibar"):
+            tmp = source.with_name(".cad.xml.tmp")
+            tmp.write_text(f"{head}{sep}{word} {tail}")
+            tmp.replace(source)
+        wait_for(lambda: daemon.counters["renders"] == 2)
+
+        url = f"http://127.0.0.1:{server.server_port}/status"
+        with urlopen(url) as response:
+            status = json.loads(response.read())
+        act = status["acts"][str(source)]
+        assert len(act["modified"]) == 1
+        assert act["added"] == act["removed"] == []
+        assert act["reformatted"] == 1
+        assert act["reused"] == articoli - 1
+        assert act["files_written"] == 1
+        assert status["renders"] == 2 and status["errors"] == 0
+    finally:
+        daemon.stop()
+        thread.join()
+        server.shutdown()
+
+
+def test_daemon_output_dirs(cad_xml, tmp_path):
+    acts = tmp_path / "docs" / "_acts"
+    sources = [tmp_path / "docs" / "_rst" / "cad.xml"]
+    for name in ("cad", "contratti"):
+        sources += [acts / name / f"{name}.xml", acts / name / f"{name}-2021-01-01.xml"]
+    for source in sources:
+        source.parent.mkdir(parents=True, exist_ok=True)
+        source.write_text(cad_xml.read_text())
+
+    daemon = Daemon(sources, polling=True)
+    for source in daemon.sources:
+        daemon.render(source)
+    for index in (
+        tmp_path / "docs" / "index.rst",
+        acts / "cad" / "index.rst",
+        acts / "cad" / "2021-01-01" / "index.rst",
+        acts / "contratti" / "index.rst",
+    ):
+        entries = [x.strip() for x in index.read_text().splitlines() if ".rst" in x]
+        assert entries and all((index.parent / x).exists() for x in entries)
+    assert not (acts / "index.rst").exists()
+
+    with pytest.raises(ValueError):
+        Daemon([sources[1], sources[1].with_name("altro.xml")], polling=True)
+
+
+@pytest.mark.skipif(inotify() is None, reason="inotify non disponibile")
+def test_inotify_overflow(tmp_path):
+    sources = {tmp_path / "a" / "a.xml", tmp_path / "b" / "b.xml"}
+    for source in sources:
+        source.parent.mkdir()
+    watcher = InotifyWatcher(sources, inotify())
+    # Replace the inotify fd with a pipe to inject the events.
+    os.close(watcher.fd)
+    watcher.fd, w = os.pipe()
+
+    def send(*events):
+        os.write(w, b"".join(IN_EVENT.pack(wd, mask, 0, 0) for wd, mask in events))
+        return watcher.wait(1)
+
+    try:
+        assert send((-1, IN_Q_OVERFLOW)) == sources
+        assert send((12345, IN_CLOSE_WRITE), (12345, IN_IGNORED)) == set()
+    finally:
+        watcher.close()
+        os.close(w)
+
+
+@pytest.mark.skipif(inotify() is None, reason="inotify non disponibile")
+def test_inotify_removed_dirs(tmp_path):
+    docs = tmp_path / "docs"
+    sources = {docs / "_rst" / "cad.xml", docs / "_acts" / "cad" / "cad.xml"}
+    for source in sources:
+        source.parent.mkdir(parents=True)
+    watcher = InotifyWatcher(sources, inotify())
+
+    def changes(expected):
+        changed = set()
+        deadline = time.monotonic() + 10
+        while changed != expected and time.monotonic() < deadline:
+            changed |= watcher.wait(0.1)
+        return changed
+
+    try:
+        # make clean, then the spider saves the acts again.
+        shutil.rmtree(docs / "_rst")
+        shutil.rmtree(docs / "_acts")
+        removed = {s.parent for s in sources}
+        wait_for(lambda: not watcher.wait(0.1) and watcher.missing == removed)
+        for source in sources:
+            source.parent.mkdir(parents=True)
+            source.write_text("<NIR/>")
+        assert changes(sources) == sources
+        assert not watcher.missing
+        assert set(watcher.dirs.values()) == {s.parent for s in sources}
+
+        # The new watches report the next changes.
+        source = docs / "_acts" / "cad" / "cad.xml"
+        source.write_text("<NIR/>")
+        assert changes({source}) == {source}
+    finally:
+        watcher.close()
@@ -0,0 +1,47 @@
+import json
+import re
+
+from cad_normattiva.diff import diff_history
+from cad_normattiva.formatter import find_snapshots
+from cad_normattiva.synthetic import synthetic_cad
+
+
+def test_diff_history(tmp_path):
+    old = synthetic_cad(capi=2, sezioni=0, articoli=4)
+    new = re.sub(r'<articolo id="3">.*?</articolo>', "", old, flags=re.S)
+    new = new.replace("<p>2. ", "<p>2. ((Comma modificato.)) ", 1)
+    new = new.replace(
+        "</capo>",
+        '<articolo id="99"><corpo><p>Art. 99 </p>'
+        "<p>(Nuovo) </p><p>1. Testo. </p></corpo></articolo></capo>",
+        1,
+    )
+    (tmp_path / "cad-2020-01-01.xml").write_text(old)
+    (tmp_path / "cad-2021-01-01.xml").write_text(new)
+    (tmp_path / "cad-2022-01-01.xml").write_text(new)
+
+    outdir = tmp_path / "modifiche"
+    report = diff_history(find_snapshots(str(tmp_path)), outdir)
+    assert report == [
+        {
+            "from": "2020-01-01",
+            "to": "2021-01-01",
+            "added": 1,
+            "removed": 1,
+            "modified": 1,
+        },
+        {
+            "from": "2021-01-01",
+            "to": "2022-01-01",
+            "added": 0,
+            "removed": 0,
+            "modified": 0,
+        },
+    ]
+    changes = json.loads((outdir / "2020-01-01_2021-01-01.json").read_text())
+    assert [a["id"] for a in changes["added"]] == ["99"]
+    assert [a["id"] for a in changes["removed"]] == ["3"]
+    assert changes["modified"][0]["commi"]["modified"] == ["2"]
+    assert any("Comma modificato" in l for l in changes["modified"][0]["diff"])
+    assert "Nessuna modifica" in (outdir / "2021-01-01_2022-01-01.rst").read_text()
+    assert "2020-01-01_2021-01-01" in (outdir / "index.rst").read_text()
@@ -0,0 +1,45 @@
+import json
+
+from cad_normattiva.emitters import (
+    HtmlEmitter,
+    JsonlEmitter,
+    MarkdownEmitter,
+    RstEmitter,
+)
+from cad_normattiva.formatter import CAD
+
+
+def test_emit_single_pass(cad, tmp_path):
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    rst = tmp_path / "docs" / "_rst"
+    rst.mkdir(parents=True)
+    written, md, jsonl, html = cadparser.emit(
+        [
+            RstEmitter(str(rst)),
+            MarkdownEmitter(tmp_path / "cad.md"),
+            JsonlEmitter(tmp_path / "cad.jsonl"),
+            HtmlEmitter(tmp_path / "cad.html"),
+        ]
+    )
+    articoli = list(cadparser.iter_articoli())
+    assert len(written) == len(list(rst.glob("*.rst"))) + 1
+
+    voci = [json.loads(l) for l in jsonl.read_text().splitlines()]
+    assert [v["id"] for v in voci] == [a.id for _, a in articoli]
+    for voce in voci:
+        assert "\\)" not in voce["text"]
+        assert all(c["text"].startswith(f"{c['id']}. ") for c in voce["commi"])
+
+    percorso, articolo = articoli[0]
+    assert f"{'#' * (len(percorso) + 2)} {articolo.titolo}\n" in md.read_text()
+    assert f'<section id="{percorso[0].nome}">' in html.read_text()
+    assert html.read_text().endswith("</html>\n")
+
+
+def test_jsonl_stdout(cad, capsys):
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    assert cadparser.emit([JsonlEmitter("-")]) == [None]
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == len(list(cadparser.iter_articoli()))
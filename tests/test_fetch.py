@@ -0,0 +1,112 @@
+import asyncio
+import itertools
+
+import pytest
+
+from cad_normattiva.acts import FetchState
+from cad_normattiva.fetch import Fetcher, form_request
+
+web = pytest.importorskip("aiohttp.web")
+
+LANDING = """<html><head><meta property="eli:title" content=" Atto {n}. "/></head>
+<body><input name="atto.codiceRedazionale" value="00{n}G0001"/>
+<input name="atto.dataPubblicazioneGazzetta" value="2005-05-16"/>
+<a href="/atto?atto.dataVigenza=2021-01-0{n}">vigenza</a></body></html>"""
+
+EXPORT = """<html><body><form id="anteprima" method="post" action="/atto/caricaXml">
+<input type="hidden" name="atto.codiceRedazionale" value="{codice}"/>
+<input type="checkbox" name="nota"/>
+<input type="submit" name="generaPdf" value="pdf"/>
+<input type="submit" name="generaXml" value="xml"/></form></body></html>"""
+
+
+def test_form_request():
+    method, action, data = form_request(
+        EXPORT.format(codice="X"),
+        "http://h/atto/vediMenuExport?a=1",
+        "anteprima",
+        "generaXml",
+    )
+    assert (method, action) == ("POST", "http://h/atto/caricaXml")
+    assert data == [("atto.codiceRedazionale", "X"), ("generaXml", "xml")]
+
+
+def mock_normattiva():
+    """Tre passi come normattiva: sessione via cookie, un 503 al primo export."""
+    sessions, counter, calls = {}, itertools.count(), []
+
+    async def landing(request):
+        calls.append("landing")
+        session = str(next(counter))
+        n = request.query_string.rsplit(";", 1)[-1]
+        sessions[session] = n
+        response = web.Response(text=LANDING.format(n=n), content_type="text/html")
+        response.set_cookie("JSESSIONID", session)
+        return response
+
+    async def export(request):
+        calls.append("export")
+        if calls.count("export") == 1:
+            return web.Response(status=503)
+        n = sessions[request.cookies["JSESSIONID"]]
+        assert request.query["atto.codiceRedazionale"] == f"00{n}G0001"
+        return web.Response(text=EXPORT.format(codice=n), content_type="text/html")
+
+    async def xml(request):
+        calls.append("xml")
+        data = await request.post()
+        assert "generaXml" in data
+        assert data["atto.codiceRedazionale"] == sessions[request.cookies["JSESSIONID"]]
+        return web.Response(
+            body=f"<NIR>{data['atto.codiceRedazionale']}</NIR>".encode()
+        )
+
+    app = web.Application()
+    app.router.add_get("/uri-res/N2Ls", landing)
+    app.router.add_get("/atto/vediMenuExport", export)
+    app.router.add_post("/atto/caricaXml", xml)
+    return app, calls
+
+
+async def fetch_all(tmp_path, force=False):
+    app, calls = mock_normattiva()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    acts = [
+        {
+            "urn": f"urn:nir:stato:legge:2020;{n}",
+            "name": f"atto{n}",
+            "dpath": tmp_path / f"atto{n}",
+        }
+        for n in (1, 2, 3)
+    ]
+    try:
+        results = await Fetcher(
+            acts,
+            FetchState(tmp_path / "state.yml"),
+            baseurl=f"http://127.0.0.1:{port}/",
+            force=force,
+            concurrency=2,
+            backoff=0.01,
+        ).run()
+    finally:
+        await runner.cleanup()
+    return results, calls
+
+
+def test_fetch(tmp_path):
+    results, calls = asyncio.run(fetch_all(tmp_path))
+    assert results == [True, True, True]
+    assert calls.count("xml") == 3
+    for n in (1, 2, 3):
+        dpath = tmp_path / f"atto{n}"
+        assert (dpath / f"atto{n}.xml").read_text() == f"<NIR>{n}</NIR>"
+        assert (dpath / f"atto{n}-2021-01-0{n}.xml").exists()
+        assert "Atto" in (dpath / "document_settings.yml").read_text()
+
+    results, calls = asyncio.run(fetch_all(tmp_path))
+    assert results == [False, False, False]
+    assert calls == ["landing"] * 3
@@ -0,0 +1,288 @@
+import json
+import subprocess
+import sys
+
+import pytest
+from parsel import Selector
+
+from cad_normattiva.cli import main
+from cad_normattiva.formatter import (
+    CAD,
+    MemoryCache,
+    OutputWriter,
+    ParseCache,
+    Struttura,
+    find_snapshots,
+    fix_accent,
+    format_articolo,
+    mkfilename,
+    parse_batch,
+    parse_capo,
+)
+from cad_normattiva.rules import ACCENT_RULES, compile_accent_rules, read_accent_rules
+
+
+def test_cad(cad, tmp_path):
+    outdir = tmp_path / "_rst"
+    outdir.mkdir()
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    assert cadparser.dump_index(outdir)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("liberta' e' cioe' un po' Po'", "libertà è cioè un po' Po'"),
+        ("E' la pò", "È la po'"),
+        ("e' vero", "è vero"),
+        ("non e'", "non è"),
+        ("e\\'", "è"),
+    ],
+)
+def test_fix_accent(text, expected):
+    assert fix_accent(text) == expected
+
+
+def test_fix_accent_rules():
+    plan = compile_accent_rules(ACCENT_RULES + (("U'", "Ù"),))
+    assert fix_accent("PIU' liberta'", plan) == "PIÙ libertà"
+
+
+def test_accent_plan(codice, tmp_path):
+    rules = tmp_path / "regole.json"
+    rules.write_text('[["U\'", "Ù"]]')
+    plan = read_accent_rules(rules)
+    lines = ["Art. 1", "(Definizioni) ", "1. PIU' liberta'. "]
+    assert "PIÙ libertà" in format_articolo(lines, plan)[1]
+    assert ParseCache.key(lines) != ParseCache.key(lines, plan)
+
+    fpath = tmp_path / "codice.xml"
+    fpath.write_text(codice.replace("Testo", "PIU' testo"))
+    for cadparser, workers in (
+        (CAD(text=fpath.read_text(), schema="codice", plan=plan), 2),
+        (CAD(source=fpath, schema="codice", plan=plan), None),
+    ):
+        cadparser.parse(workers=workers)
+        assert all("PIÙ testo" in a.testo for _, a in cadparser.iter_articoli())
+
+
+def test_dump_index_incremental(cad, tmp_path):
+    outdir = tmp_path / "_rst"
+    outdir.mkdir()
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    changed = cadparser.dump_index(outdir, incremental=True)
+    assert changed
+
+    orphan = outdir / "capo_0-articolo_0.rst"
+    orphan.write_text("abrogato")
+    manifest = json.loads((outdir / OutputWriter.MANIFEST).read_text())
+    manifest[orphan.name] = ["", 0, 0]
+    (outdir / OutputWriter.MANIFEST).write_text(json.dumps(manifest))
+
+    assert cadparser.dump_index(outdir, incremental=True) == []
+    assert not orphan.exists()
+
+
+def test_parse_cache(cad, tmp_path):
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+
+    cache = ParseCache(tmp_path, max_entries=1000)
+    CAD(text=cad).parse(cache=cache)
+    cache.close()
+    assert cache.hits == 0
+
+    cache = ParseCache(tmp_path, max_entries=1000)
+    cachedparser = CAD(text=cad)
+    cachedparser.parse(cache=cache)
+    cache.close()
+    assert cache.misses == 0
+    assert cachedparser.partizioni == cadparser.partizioni
+
+    cache = ParseCache(tmp_path, max_entries=1000, version="changed")
+    assert cache.get(ParseCache.key(["Art. 1"])) is None
+    cache.close()
+
+
+def test_cache_bounded(cad, tmp_path):
+    cache = MemoryCache(max_entries=10)
+    CAD(text=cad).parse(cache=cache)
+    assert len(cache.pending) == 10
+
+    cache = ParseCache(tmp_path, max_entries=1000)
+    cache.FLUSH = 10
+    CAD(text=cad).parse(workers=2, cache=cache)
+    assert len(cache.pending) < 10
+    cache.close()
+    assert not cache.pending
+
+    cache = ParseCache(tmp_path, max_entries=1000)
+    CAD(text=cad).parse(cache=cache)
+    cache.close()
+    assert cache.misses == 0
+
+
+def test_parse_batch(cad, tmp_path):
+    for version in ("2020-01-01", "2021-01-01"):
+        (tmp_path / f"cad-{version}.xml").write_text(cad)
+    report = parse_batch(find_snapshots(str(tmp_path)), tmp_path / "out")
+    assert [r["version"] for r in report] == ["2020-01-01", "2021-01-01"]
+    assert report[0]["reused"] < report[1]["reused"] == report[1]["articoli"]
+    assert (tmp_path / "out" / "2021-01-01" / "index.rst").exists()
+
+
+def test_cli_batch_formats(cad, tmp_path):
+    (tmp_path / "cad-2020-01-01.xml").write_text(cad)
+    outdir = tmp_path / "out"
+    main(["--batch", str(tmp_path), "--outdir", str(outdir), "--format", "jsonl"])
+    assert (outdir / "2020-01-01" / "cad-2020-01-01.jsonl").exists()
+    assert not (outdir / "2020-01-01" / "index.rst").exists()
+
+    # A single FILE would be overwritten by each version.
+    with pytest.raises(SystemExit):
+        main(["--batch", str(tmp_path), "--format", "jsonl=out.jsonl"])
+
+
+def test_dump_index_atomic(cad, tmp_path):
+    outdir = tmp_path / "_rst"
+    outdir.mkdir()
+    (outdir / "cad.xml").write_text(cad)
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    cadparser.dump_index(outdir, incremental=True)
+    expected = {f.name: f.read_text() for f in outdir.iterdir()}
+
+    for _ in range(3):
+        previous = outdir.resolve()
+        cadparser.dump_index(outdir, incremental=True, atomic=True)
+        assert outdir.is_symlink()
+        assert {f.name: f.read_text() for f in outdir.iterdir()} == expected
+        # The previous generation is kept for its readers until the next run.
+        assert {f.name: f.read_text() for f in previous.iterdir()} == expected
+        assert len(list(tmp_path.glob("_rst.*"))) == 2
+
+
+def test_dump_index_atomic_index(cad, tmp_path, monkeypatch):
+    outdir = tmp_path / "_rst"
+    outdir.mkdir()
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    cadparser.dump_index(outdir, atomic=True)
+    index = tmp_path / "index.rst"
+    old = index.read_text()
+
+    # ../index.rst is replaced only after the new tree is published.
+    swap = OutputWriter._swap
+    seen = []
+
+    def check_swap(self):
+        seen.append(index.read_text())
+        swap(self)
+
+    monkeypatch.setattr(OutputWriter, "_swap", check_swap)
+    cadparser.intestazione.titolo = "Nuovo titolo"
+    cadparser.dump_index(outdir, atomic=True)
+    assert seen == [old]
+    assert "Nuovo titolo" in index.read_text()
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+@pytest.mark.parametrize("options", [[], ["--stream"], ["--atomic"]])
+def test_cli_missing_outdir(cad_xml, tmp_path, options):
+    outdir = tmp_path / "docs" / "_rst"
+    main([str(cad_xml), "--outdir", str(outdir), *options])
+    assert (outdir / "capo_I.rst").exists()
+    assert "_rst/capo_I.rst" in (tmp_path / "docs" / "index.rst").read_text()
+
+
+def test_capo(cad):
+    selector = Selector(text=cad, type="html")
+    for s in selector.xpath("//capo"):
+        id_, text = parse_capo(s)
+        assert "Capo I" in text
+        assert "1" == id_
+        break
+
+
+def test_cad_stream(cad, cad_xml):
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    streamparser = CAD(source=cad_xml)
+    streamparser.parse()
+    assert streamparser.partizioni == cadparser.partizioni
+
+
+def test_cad_workers(cad, cad_xml):
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    for parser in (CAD(text=cad), CAD(source=cad_xml)):
+        parser.parse(workers=2)
+        assert parser.partizioni == cadparser.partizioni
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_struttura_codice(codice, codice_xml, tmp_path, stream):
+    if stream:
+        cadparser = CAD(source=codice_xml, schema="codice")
+    else:
+        cadparser = CAD(text=codice, schema="codice")
+    cadparser.parse()
+
+    percorsi = {a.id: mkfilename(percorso) for percorso, a in cadparser.iter_articoli()}
+    assert percorsi == {
+        "1": "libro_I-titolo_I.rst",
+        "2": "libro_I-titolo_I-capo_I-sezione_I.rst",
+        # Closing </capo> closes the capo and the sezione it contains.
+        "9": "libro_I-titolo_I.rst",
+        "3": "libro_II-titolo_I-capo_I.rst",
+    }
+    libro = cadparser.partizioni[1]
+    assert libro.titolo == "Libro II - DELL'APPALTO "
+    assert libro.partizioni[0].partizioni[0].titolo == "Capo I Le procedure"
+
+    assert cadparser.intestazione.estremi == "Decreto Legislativo 31 marzo 2023, n. 36"
+    outdir = tmp_path / "docs" / "_rst"
+    outdir.mkdir(parents=True)
+    cadparser.dump_index(outdir)
+    index = (outdir / ".." / "index.rst").read_text()
+    assert index.startswith("\nCodice dei contratti pubblici\n#####")
+    assert "   _rst/libro_I.rst\n   _rst/libro_II.rst\n" in index
+    assert (
+        "   libro_I-titolo_I-capo_I.rst"
+        in (outdir / "libro_I-titolo_I.rst").read_text()
+    )
+
+
+def test_struttura_sezione_senza_capo():
+    struttura = Struttura()
+    struttura.apri("Capo I. PRINCIPI")
+    struttura.apri("Capo I. - PRINCIPI Sezione I Definizioni della sezione")
+    struttura.apri("Sezione II Carta")
+    struttura.apri("Disposizioni comuni")
+    (capo,) = struttura.partizioni
+    assert capo.titolo == "Capo I. - PRINCIPI "
+    assert [s.titolo for s in capo.partizioni] == [
+        "Sezione I Definizioni della sezione",
+        "Sezione II Carta",
+    ]
+    assert struttura.percorso == (capo,)
+
+    # A repeated heading reopens the same partition.
+    struttura.apri("Capo II. SERVIZI")
+    struttura.apri("Capo I. PRINCIPI")
+    assert [c.id for c in struttura.partizioni] == ["I", "II"]
+    assert struttura.percorso == (capo,)
+
+
+def test_cli_lazy_imports():
+    code = "import sys, cad_normattiva.cli; print(' '.join(sys.modules))"
+    out = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout.split()
+    for heavy in ("scrapy", "pytest", "parsel", "lxml"):
+        assert heavy not in out
+    # Only loaded by the options that use them.
+    for name in ("diff", "emitters", "lookup", "references", "search"):
+        assert f"cad_normattiva.{name}" not in out
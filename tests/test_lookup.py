@@ -0,0 +1,60 @@
+import os
+
+from cad_normattiva.formatter import CAD, mkfilename
+from cad_normattiva.lookup import ArticoloIndex, find_vigenza
+
+
+def test_articolo_index(cad, tmp_path):
+    source = tmp_path / "cad.xml"
+    source.write_text(cad)
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+
+    index = ArticoloIndex(source)
+    for percorso, articolo in cadparser.iter_articoli():
+        rendered, entry = index.render(articolo.id)
+        if entry.partizione != mkfilename(percorso)[: -len(".rst")]:
+            # Duplicate ids resolve to the first occurrence.
+            continue
+        assert rendered == articolo
+    index.close()
+
+
+def test_articolo_index_schema(codice_xml):
+    index = ArticoloIndex(codice_xml, schema="codice")
+    assert [(e.id, e.partizione) for e in index] == [
+        ("1", "libro_I-titolo_I"),
+        ("2", "libro_I-titolo_I-capo_I-sezione_I"),
+        ("9", "libro_I-titolo_I"),
+        ("3", "libro_II-titolo_I-capo_I"),
+    ]
+    articolo, _ = index.render("9")
+    assert articolo.titolo == "Art. 9. Dopo il capo"
+    index.close()
+
+    # Another schema rebuilds the index.
+    index = ArticoloIndex(codice_xml, schema="capo,sezione")
+    assert index.get("2").partizione == "capo_I-sezione_I"
+    index.close()
+
+
+def test_articolo_index_stale(cad, tmp_path):
+    source = tmp_path / "cad.xml"
+    source.write_text(cad)
+    index = ArticoloIndex(source)
+    first = next(iter(index))
+    assert not index.is_stale()
+    index.close()
+
+    source.write_text("<!-- -->\n" + cad)
+    os.utime(source, ns=(0, 0))
+    index = ArticoloIndex(source)
+    assert index.get(first.id).offset == first.offset + len("<!-- -->\n")
+    index.close()
+
+
+def test_find_vigenza(tmp_path):
+    for version in ("2020-01-01", "2021-01-01", "2022-01-01"):
+        (tmp_path / f"cad-{version}.xml").write_text("")
+    assert find_vigenza(str(tmp_path)).name == "cad-2022-01-01.xml"
+    assert find_vigenza(str(tmp_path), "2021-06-30").name == "cad-2021-01-01.xml"
@@ -0,0 +1,91 @@
+from cad_normattiva.emitters import rst_articolo
+from cad_normattiva.formatter import CAD, format_articolo
+from cad_normattiva.model import Articolo, chiave_articolo
+
+
+def test_articolo_from_text():
+    intro, text, offsets = format_articolo(
+        [
+            "Capo I",
+            "Art. 3-bis",
+            "(Identita' digitale)",
+            "1. Chiunque ha il diritto di accedere:",
+            "a) ai servizi;",
+            "b) ai dati.",
+            "1-bis. Il comma aggiunto.",
+            "Testo che segue",
+            "la lista.",
+        ]
+    )
+    assert intro == "Capo I\n\n"
+    articolo = Articolo.from_text(text, offsets)
+    assert articolo.id == "3-bis"
+    assert articolo.titolo == "Art. 3-bis. Identità digitale"
+    assert [c.id for c in articolo.commi] == ["1", "1-bis"]
+    assert "b) ai dati." in articolo.comma_text("1")
+    assert (
+        articolo.comma_text("1-bis")
+        == "1-bis. Il comma aggiunto.\nTesto che segue\nla lista."
+    )
+    assert articolo.paragrafi()[-2:] == [
+        ("1-bis.", "Il comma aggiunto."),
+        ("", "Testo che segue\nla lista."),
+    ]
+
+    assert rst_articolo(articolo) == text
+    assert text.startswith("Art. 3-bis. Identità digitale\n" + "^" * 30 + "\n\n")
+    assert "\n  b\\) ai dati.\n\n  1-bis\\. Il comma aggiunto.\n\n\nTesto" in text
+
+
+def test_format_articolo_rst():
+    """The RST bytes of an article, with and without an intro."""
+    lines = ["Art. 2", "(Finalita')", "1. Lo Stato e' tenuto:", "a) a cio';", "Fine."]
+    assert format_articolo(lines)[:2] == (
+        None,
+        "Art. 2. Finalità\n"
+        "^^^^^^^^^^^^^^^^^\n"
+        "\n"
+        "\n"
+        "  1\\. Lo Stato è tenuto:\n"
+        "\n"
+        "  a\\) a ciò;\n"
+        "\n"
+        "\n"
+        "Fine.\n",
+    )
+    assert format_articolo(["Capo I", "1. Premessa", *lines])[:2] == (
+        "Capo I\n\n  1\\. Premessa\n\n\n\n",
+        "Art. 2. Finalità\n"
+        "^^^^^^^^^^^^^^^^^\n"
+        "\n"
+        "\n"
+        "  1\\. Lo Stato è tenuto:\n"
+        "\n"
+        "  a\\) a ciò;\n"
+        "\n"
+        "\n"
+        "Fine.\n"
+        "\n",
+    )
+
+
+def test_iter_articoli(cad):
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    articoli = list(cadparser.iter_articoli())
+    assert articoli
+    for percorso, articolo in articoli:
+        assert percorso[0] in cadparser.partizioni
+        assert articolo in percorso[-1].articoli
+        assert articolo.titolo.startswith(f"Art. {articolo.id}")
+
+
+def test_chiave_articolo():
+    chiavi = set()
+    articoli = [
+        Articolo("1", "Art. 1"),
+        Articolo("2", "Art. 2"),
+        Articolo("1", "Art. 1"),
+    ]
+    assert [chiave_articolo(a, chiavi) for a in articoli] == ["1", "2", "1#2"]
+    assert chiavi == {"1", "2", "1#2"}
@@ -0,0 +1,67 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from cad_normattiva.formatter import CAD
+from cad_normattiva.profiler import PROFILER, merge_report
+
+
+@pytest.fixture
+def profiler():
+    PROFILER.start()
+    yield PROFILER
+    PROFILER.__init__()
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_profiler_articoli(cad, profiler, workers):
+    cadparser = CAD(text=cad)
+    cadparser.parse(workers=workers)
+    report = profiler.report()["articoli"]
+    assert report["count"] == sum(1 for _ in cadparser.iter_articoli())
+    assert report["count"] == profiler.counters["articoli"]
+    assert report["slowest"][0]["articolo"].startswith("Art.")
+    assert report["seconds"] >= report["slowest"][0]["seconds"] > 0
+
+
+def test_merge_report(tmp_path):
+    fpath = tmp_path / "_build" / "profile.json"
+    merge_report(fpath, {"stages": {"spider": 2.0}, "counters": {"bytes_in": 1}})
+    merge_report(
+        fpath,
+        {
+            "stages": {"parse": 1.0},
+            "counters": {"articoli": 3},
+            "articoli": {"count": 3},
+        },
+    )
+    report = json.loads(fpath.read_text())
+    assert report["stages"] == {"spider": 2.0, "parse": 1.0}
+    assert report["counters"] == {"bytes_in": 1, "articoli": 3}
+    assert report["articoli"] == {"count": 3}
+    assert "timestamp" in report
+
+
+def test_profiler_command(tmp_path):
+    fpath = tmp_path / "profile.json"
+    merge_report(fpath, {"stages": {"parse": 1.0}})
+    ret = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "cad_normattiva.profiler",
+            "--report",
+            str(fpath),
+            "--stage",
+            "sphinx",
+            "--",
+            sys.executable,
+            "-c",
+            "import sys; sys.exit(3)",
+        ]
+    )
+    assert ret.returncode == 3
+    stages = json.loads(fpath.read_text())["stages"]
+    assert stages["parse"] == 1.0 and stages["sphinx"] > 0
@@ -0,0 +1,155 @@
+import json
+from functools import partial
+
+from cad_normattiva.emitters import rst_articolo
+from cad_normattiva.formatter import CAD, format_articolo
+from cad_normattiva.model import Articolo, Partizione
+from cad_normattiva.references import Riferimenti, cited_by
+
+
+def articolo(*lines):
+    _, text, offsets = format_articolo(list(lines))
+    return Articolo.from_text(text, offsets)
+
+
+def make_cad():
+    cad = CAD()
+    cad.partizioni = [
+        Partizione(
+            "capo",
+            "I",
+            "Capo I. PRINCIPI",
+            figli=[
+                articolo(
+                    "Art. 1",
+                    "(Definizioni)",
+                    "1. Si veda l'art. 64 bis.",
+                    "2. Vedi l'articolo 2a.",
+                ),
+                articolo(
+                    "Art. 2",
+                    "(Ambito)",
+                    "1. Come previsto dall'articolo 1 della legge 7 agosto "
+                    "1990, n. 241.",
+                    "2. Ai sensi dell'articolo 64-bis, comma 2, "
+                    "dell'articolo 1 del presente codice e dell'articolo 2.",
+                ),
+            ],
+        ),
+        Partizione(
+            "capo",
+            "II",
+            "Capo II. SERVIZI",
+            figli=[
+                Partizione(
+                    "sezione",
+                    "I",
+                    "Sezione I",
+                    figli=[articolo("Art. 64-bis", "(Accesso)")],
+                )
+            ],
+        ),
+    ]
+    return cad
+
+
+def test_riferimenti():
+    riferimenti = Riferimenti(make_cad())
+    assert riferimenti.citato_da == {
+        "64-bis": [
+            {"articolo": "1", "comma": "1", "comma_citato": ""},
+            {"articolo": "2", "comma": "2", "comma_citato": "2"},
+        ],
+        "1": [{"articolo": "2", "comma": "2", "comma_citato": ""}],
+    }
+    assert riferimenti.esterni == {"legge 7 agosto 1990, n. 241": ["2"]}
+
+    link = partial(riferimenti.link_rst, "capo_I-articolo_2")
+    text = rst_articolo(make_cad().partizioni[0].articoli[1], link)
+    assert ":doc:`articolo 64-bis, comma 2 <capo_II-sezione_I-articolo_64-bis>`" in text
+    assert ":doc:`articolo 1 <capo_I-articolo_1>` del presente codice" in text
+    assert "dall'articolo 1 della legge" in text
+    # "2a" is not article 2.
+    link = partial(riferimenti.link_rst, "capo_I-articolo_1")
+    text = rst_articolo(make_cad().partizioni[0].articoli[0], link)
+    assert "Vedi l'articolo 2a." in text
+
+
+def test_riferimenti_altri_atti():
+    cad = CAD()
+    cad.partizioni = [
+        Partizione(
+            "capo",
+            "I",
+            "Capo I. PRINCIPI",
+            figli=[
+                articolo(
+                    "Art. 1",
+                    "(Definizioni)",
+                    "1. Ai sensi dell'articolo 2, comma 1, lettera a), del decreto "
+                    "legislativo 30 giugno 2003, n. 196.",
+                    "2. Gli articoli 3 e 4 della legge 7 agosto 1990, n. 241.",
+                    "3. Di cui all'articolo 2, comma 2, lettera c), della legge "
+                    "4 novembre 2010, n. 183.",
+                    "4. Ai sensi dell'articolo 3 e dell'articolo 4 della legge "
+                    "7 agosto 1990, n. 241.",
+                    "5. Di cui all'articolo 4, comma 1, lettere a) e b), del "
+                    "presente codice.",
+                ),
+                articolo("Art. 2", "(Ambito)"),
+                articolo("Art. 3", "(Principi)"),
+                articolo("Art. 4", "(Servizi)"),
+            ],
+        )
+    ]
+    riferimenti = Riferimenti(cad)
+    assert riferimenti.citato_da == {
+        "4": [{"articolo": "1", "comma": "5", "comma_citato": "1"}]
+    }
+    assert [r.articolo for r in riferimenti.links["capo_I-articolo_1"]] == ["4"]
+
+
+def test_dump_index_links(tmp_path):
+    outdir = tmp_path / "_rst"
+    outdir.mkdir()
+    make_cad().dump_index(str(outdir), links=True)
+    assert ":doc:`art. 64 bis <" in (outdir / "capo_I-articolo_1.rst").read_text()
+    assert cited_by(outdir, "1") == [
+        {"articolo": "2", "comma": "2", "comma_citato": ""}
+    ]
+    assert "esterni" in json.loads((outdir / "riferimenti.json").read_text())
+
+
+def test_riferimenti_elenco():
+    cad = CAD()
+    cad.partizioni = [
+        Partizione(
+            "capo",
+            "I",
+            "Capo I. PRINCIPI",
+            figli=[
+                articolo(
+                    "Art. 1",
+                    "(Definizioni)",
+                    "1. Come previsto dagli articoli 3 e 5.",
+                    "2. Gli artt. 2, 3 e dell'articolo 5 del presente codice.",
+                ),
+                articolo("Art. 2", "(Ambito)"),
+                articolo("Art. 3", "(Principi)"),
+                articolo("Art. 5", "(Servizi)"),
+            ],
+        )
+    ]
+    riferimenti = Riferimenti(cad)
+    assert {k: [c["comma"] for c in v] for k, v in riferimenti.citato_da.items()} == {
+        "2": ["2"],
+        "3": ["1", "2"],
+        "5": ["1", "2"],
+    }
+    link = partial(riferimenti.link_rst, "capo_I-articolo_1")
+    text = rst_articolo(cad.partizioni[0].articoli[0], link)
+    assert (
+        "dagli :doc:`articoli 3 <capo_I-articolo_3>` e :doc:`5 <capo_I-articolo_5>`."
+        in text
+    )
+    assert ":doc:`3 <capo_I-articolo_3>` e dell':doc:`articolo 5" in text
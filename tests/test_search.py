@@ -0,0 +1,66 @@
+from cad_normattiva.formatter import CAD
+from cad_normattiva.search import SearchIndex, atto_version, match_query
+
+
+def index_snapshot(index, fpath):
+    writer = index.writer(fpath)
+    cadparser = CAD(text=fpath.read_text())
+    cadparser.parse(index=writer)
+    return cadparser, writer.close()
+
+
+def test_atto_version():
+    assert atto_version("docs/_acts/cad/cad-2021-01-01.xml") == ("cad", "2021-01-01")
+    assert atto_version("docs/_rst/cad.xml") == ("cad", "")
+    assert match_query("dell'identita' firm*") == '"dell" "identita" "firm"*'
+
+
+def test_search_incremental(cad_xml, tmp_path):
+    index = SearchIndex(tmp_path / "search.sqlite")
+    cadparser, stats = index_snapshot(index, cad_xml)
+    articoli = list(cadparser.iter_articoli())
+    assert stats["added"] == len(articoli)
+
+    # Accents in the query and in the text are ignored.
+    results = index.search("identita")
+    assert results
+    assert "[identità]" in results[0].snippet.lower()
+
+    # A new snapshot reindexes only the changed articles.
+    head, sep, tail = cad_xml.read_text().rpartition("<p>1. ")
+    changed = tmp_path / "cad-2030-01-01.xml"
+    changed.write_text(f"{head}{sep}zanzibar {tail}")
+    _, stats = index_snapshot(index, changed)
+    assert stats == {"added": 0, "updated": 1, "removed": 0}
+    results = index.search("Zanzibar")
+    assert [(r.atto, r.versione, r.comma) for r in results] == [
+        ("cad", "2030-01-01", "1")
+    ]
+    index.close()
+
+
+def test_search_large_articolo(tmp_path):
+    from cad_normattiva.synthetic import synthetic_cad
+
+    # More commi than fit in 4096 rowids per article.
+    fpath = tmp_path / "cad.xml"
+    fpath.write_text(synthetic_cad(capi=1, sezioni=0, articoli=2, commi=5000))
+    index = SearchIndex(tmp_path / "search.sqlite")
+    _, stats = index_snapshot(index, fpath)
+    assert stats["added"] == 2
+    sql = "SELECT articolo, count(*) FROM voci GROUP BY articolo ORDER BY articolo"
+    before = index.db.execute(sql).fetchall()
+    assert [n > 5000 for _, n in before] == [True, True]
+
+    # Updating the first article leaves the commi of the second one alone.
+    head, sep, tail = fpath.read_text().partition("<p>1. ")
+    changed = tmp_path / "cad-2030-01-01.xml"
+    changed.write_text(f"{head}{sep}zanzibar {tail}")
+    _, stats = index_snapshot(index, changed)
+    assert stats == {"added": 0, "updated": 1, "removed": 0}
+    assert index.db.execute(sql).fetchall() == before
+    assert index.db.execute("SELECT count(*) FROM commi").fetchone()[0] == sum(
+        n for _, n in before
+    )
+    assert [r.comma for r in index.search("zanzibar")] == ["1"]
+    index.close()
@@ -0,0 +1,85 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from cad_normattiva.acts import FetchState, save_act
+
+pytest.importorskip("scrapy")
+from scrapy.http import HtmlResponse, Request  # noqa: E402
+
+LANDING = """<html><head><meta property="eli:title" content=" Atto. "/></head>
+<body><input name="atto.codiceRedazionale" value="001G0001"/>
+<input name="atto.dataPubblicazioneGazzetta" value="2020-01-01"/>
+<a href="/atto?atto.dataVigenza=2021-01-01">vigenza</a></body></html>"""
+
+
+def load_spider():
+    fpath = Path(__file__).parent.parent / "scrapy" / "normattiva.py"
+    spec = importlib.util.spec_from_file_location("normattiva_spider", fpath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.BasicSpider
+
+
+@pytest.fixture
+def spider_args(tmp_path):
+    """Un atto gia' scaricato, con il suo stato."""
+    urns = tmp_path / "atti.txt"
+    urns.write_text("urn:nir:stato:legge:2020;1 atto\n")
+    state = FetchState(tmp_path / "state.yml")
+    act = {
+        "urn": "urn:nir:stato:legge:2020;1",
+        "name": "atto",
+        "dpath": tmp_path / "acts" / "atto",
+        "codiceRedazionale": "001G0001",
+        "dataPubblicazioneGazzetta": "2020-01-01",
+        "dataVigenza": "2021-01-01",
+        "titolo": "Atto",
+    }
+    save_act(act, b"<NIR>atto</NIR>", state)
+    return {
+        "urns": str(urns),
+        "outdir": str(tmp_path / "acts"),
+        "state": str(tmp_path / "state.yml"),
+    }
+
+
+def landing(spider):
+    act = spider.acts[0]
+    request = Request(spider.baseurl + act["urn"], meta={"cookiejar": 0})
+    response = HtmlResponse(
+        request.url, body=LANDING.encode(), encoding="utf-8", request=request
+    )
+    return list(spider.parse(response, act))
+
+
+def test_spider_skips_unchanged(spider_args, tmp_path):
+    BasicSpider = load_spider()
+    assert landing(BasicSpider(**spider_args)) == []
+
+    (request,) = landing(BasicSpider(force="1", **spider_args))
+    assert request.url.startswith("https://www.normattiva.it/atto/vediMenuExport?")
+    assert "atto.codiceRedazionale=001G0001" in request.url
+
+    # A saved export that no longer matches its sha1 is downloaded again.
+    (tmp_path / "acts" / "atto" / "atto-2021-01-01.xml").write_text("<NIR/>")
+    assert len(landing(BasicSpider(**spider_args))) == 1
+
+
+def test_spider_baseurl(spider_args):
+    spider = load_spider()(baseurl="http://localhost:8000/", **spider_args)
+    (request,) = spider.start_requests()
+    assert (
+        request.url == "http://localhost:8000/uri-res/N2Ls?urn:nir:stato:legge:2020;1"
+    )
+    assert spider.allowed_domains == ["localhost"]
+
+
+def test_spider_offline(spider_args, tmp_path):
+    dpath = tmp_path / "acts" / "atto"
+    (dpath / "atto.xml").unlink()
+    spider = load_spider()(offline="1", **spider_args)
+    assert list(spider.start_requests()) == []
+    assert (dpath / "atto.xml").read_bytes() == b"<NIR>atto</NIR>"
+    assert "Atto" in (dpath / "document_settings.yml").read_text()
@@ -0,0 +1,63 @@
+import pytest
+
+from cad_normattiva.acts import FetchState, replay_act, save_act
+from cad_normattiva.formatter import CAD
+from cad_normattiva.lookup import ArticoloIndex
+from cad_normattiva.store import SnapshotStore, open_snapshot, read_snapshot, zstandard
+
+CODECS = [
+    "gzip",
+    pytest.param(
+        "zstd",
+        marks=pytest.mark.skipif(
+            zstandard() is None, reason="zstandard non installato"
+        ),
+    ),
+]
+
+
+def test_save_act_store(tmp_path):
+    store = SnapshotStore(tmp_path / "store", codec="gzip")
+    state = FetchState(tmp_path / "state.yml")
+    body = b"<NIR>testo</NIR>"
+    act = {
+        "urn": "urn:nir:stato:legge:2020;1",
+        "name": "atto",
+        "dpath": tmp_path / "atto",
+        "codiceRedazionale": "001",
+        "dataPubblicazioneGazzetta": "2020-01-01",
+        "titolo": "Atto",
+    }
+    for vigenza in ("2020-01-01", "2021-01-01"):
+        save_act(dict(act, dataVigenza=vigenza), body, state, store=store)
+
+    objects = list((tmp_path / "store" / "objects").glob("*/*"))
+    assert len(objects) == 1
+    for name in ("atto.xml", "atto-2020-01-01.xml", "atto-2021-01-01.xml"):
+        fpath = tmp_path / "atto" / name
+        assert fpath.is_symlink() and fpath.resolve() == objects[0].resolve()
+        assert read_snapshot(fpath) == body.decode()
+    assert state.is_unchanged(act["urn"], dict(act, dataVigenza="2021-01-01"))
+
+    # Replaying without a store must not write into the stored object.
+    assert replay_act(dict(act), state)
+    assert not (tmp_path / "atto" / "atto.xml").is_symlink()
+    assert read_snapshot(objects[0]) == body.decode()
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_cad_compressed(cad, tmp_path, codec):
+    _, fpath = SnapshotStore(tmp_path, codec=codec).put(cad.encode())
+    with open_snapshot(fpath) as f:
+        assert f.read(5) == cad[:5].encode()
+
+    cadparser = CAD(text=cad)
+    cadparser.parse()
+    streamparser = CAD(source=fpath)
+    streamparser.parse()
+    assert streamparser.partizioni == cadparser.partizioni
+
+    index = ArticoloIndex(fpath, tmp_path / "cad.idx")
+    _, articolo = next(cadparser.iter_articoli())
+    assert index.render(articolo.id)[0] == articolo
+    index.close()